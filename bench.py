@@ -0,0 +1,272 @@
+"""
+Benchmarks for the hot paths, on fixed seed workloads so runs can be compared
+Results are written as JSON. Passing --baseline compares against an earlier
+run and exits non-zero if anything got slower than the tolerance allows
+
+    python bench.py --output bench.json
+    python bench.py --baseline bench.json
+"""
+import argparse
+import json
+import random
+import sys
+import time
+
+from card import CribbageDeck, CribbageHand, CribbagePeggingPile
+import card
+import discard
+import scoring
+
+DEFAULT_TOLERANCE = 0.25  # Fractional slowdown allowed before flagging
+
+
+def _deals(num, num_cards, seed=0):
+    rng = random.Random(seed)
+    deck = CribbageDeck()
+    deals = []
+    for _ in range(num):
+        deck.shuffle(rng)
+        deals.append((deck.deal(num_cards), deck.remaining_cards))
+    return deals
+
+
+def _clear_memos():
+    """
+    So every run measures the real work rather than cache hits
+    """
+    card.PREDICT_MEMO.clear()
+    discard.DISCARD_MEMO.clear()
+    discard._crib_draws.cache_clear()
+    scoring.expected_rank_points.cache_clear()
+
+
+def bench_count(backend=None):
+    hands = [
+        (CribbageHand(cards[:4]), cards[4])
+        for cards, _ in _deals(2000, 5)
+    ]
+
+    def run():
+        for hand, cut_card in hands:
+            hand.count(cut_card, backend=backend)
+    return run, len(hands)
+
+
+def bench_score_hands():
+    """
+    Per hand, scored 100,000 at a time
+    """
+    import numpy as np
+    from scoring import score_hands
+
+    rng = np.random.default_rng(0)
+    cards = np.argsort(rng.random((100000, 52)), axis=1)[:, :5]
+    is_crib = rng.random(len(cards)) < 0.5
+
+    def run():
+        score_hands(cards, is_crib)
+    return run, len(cards)
+
+
+def _bench_predict(num_known, is_crib=False):
+    deals = [
+        (CribbageHand(cards[:num_known]), remaining)
+        for cards, remaining in _deals(50, 6, seed=1)
+    ]
+
+    def run():
+        _clear_memos()
+        for hand, remaining_cards in deals:
+            hand.predict(remaining_cards, is_crib=is_crib)
+    return run, len(deals)
+
+
+def bench_discard():
+    """
+    All 15 discards of a six card hand, as gen_dataset does
+    """
+    deals = _deals(20, 6, seed=2)
+
+    def run():
+        _clear_memos()
+        for full_hand, _ in deals:
+            discard.optimal_discard(full_hand, True)
+    return run, len(deals)
+
+
+def bench_discard_crib_table():
+    """
+    The same, with the cribs looked up in a crib table
+    """
+    from crib_table import gen_crib_table, table_key
+
+    deals = _deals(20, 6, seed=2)
+    crib_table = gen_crib_table()
+    crib_key = table_key(crib_table)
+
+    def run():
+        _clear_memos()
+        for full_hand, _ in deals:
+            discard.optimal_discard(full_hand, True, crib_table=crib_table, crib_key=crib_key)
+    return run, len(deals)
+
+
+def bench_pegging_pile():
+    sequences = []
+    for cards, _ in _deals(500, 13, seed=3):
+        count = 0
+        sequence = []
+        for c in cards:
+            if count + c.value > CribbagePeggingPile.PEGGING_LIMIT:
+                break
+            count += c.value
+            sequence.append(c)
+        sequences.append(sequence)
+
+    def run():
+        pile = CribbagePeggingPile()
+        for sequence in sequences:
+            pile.reset()
+            for c in sequence:
+                pile.add(c)
+    return run, sum(len(sequence) for sequence in sequences)
+
+
+def bench_throw():
+    """
+    Needs a trained model, see throwing_ai.py
+    """
+    from throwing_ai import ThrowingClassifier, default_model_file
+    import os
+
+    if not os.path.exists(default_model_file()):
+        return None
+
+    classifier = ThrowingClassifier.load()
+    hands = [[c.serialize() for c in cards] for cards, _ in _deals(50, 6, seed=4)]
+    classifier.throw(0, hands[0])  # Load the model outside the timing
+
+    def run():
+        for serialized_cards in hands:
+            classifier.throw(0, serialized_cards)
+    return run, len(hands)
+
+
+def bench_throw_discard_model():
+    """
+    Needs a trained DiscardModel, see throwing_ai.py
+    """
+    from throwing_ai import DiscardModel, DISCARD_MODEL_FILE
+    import os
+
+    if not os.path.exists(DISCARD_MODEL_FILE):
+        return None
+
+    model = DiscardModel.load()
+    hands = [[c.serialize() for c in cards] for cards, _ in _deals(50, 6, seed=4)]
+    model.throw(0, hands[0])  # Load the model outside the timing
+
+    def run():
+        for serialized_cards in hands:
+            model.throw(0, serialized_cards)
+    return run, len(hands)
+
+
+def bench_game():
+    from sim import play_games, random_throw, random_peg
+
+    num_games = 100
+
+    def run():
+        for _ in play_games(num_games, [random_throw] * 2, [random_peg] * 2, seed=5):
+            pass
+    return run, num_games
+
+
+BENCHMARKS = {
+    'count': bench_count,
+    'count_bitboard': lambda: bench_count('bitboard'),
+    'score_hands': bench_score_hands,
+    'predict_hand': lambda: _bench_predict(4),
+    'predict_crib': lambda: _bench_predict(2, is_crib=True),
+    'discard': bench_discard,
+    'discard_crib_table': bench_discard_crib_table,
+    'pegging_pile_add': bench_pegging_pile,
+    'throw': bench_throw,
+    'throw_discard_model': bench_throw_discard_model,
+    'headless_game': bench_game,
+}
+
+
+def run_benchmarks(names=None, repeat=5):
+    """
+    Returns {name: {'seconds': best time per call, 'calls': calls per run}}
+    Benchmarks that can't run here are left out
+    """
+    # Built on first use, which would otherwise land in the first timed run
+    scoring.RANK_TABLE, scoring.RANK_ARRAY
+
+    results = {}
+    for name in names or BENCHMARKS:
+        setup = BENCHMARKS[name]()
+        if setup is None:
+            continue
+        run, num_calls = setup
+
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            best = min(best, time.perf_counter() - start)
+
+        results[name] = {'seconds': best / num_calls, 'calls': num_calls}
+    return results
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Names of the benchmarks that are more than tolerance slower than baseline
+    """
+    return [
+        name for name, result in results.items()
+        if name in baseline
+        and result['seconds'] > baseline[name]['seconds'] * (1 + tolerance)
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('names', nargs='*', help="Benchmarks to run, all by default")
+    parser.add_argument('--output', help="Write the results to this JSON file")
+    parser.add_argument('--baseline', help="JSON file from an earlier run to compare against")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.names, args.repeat)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as fp:
+            baseline = json.load(fp)
+
+    for name, result in results.items():
+        line = f"{name:20} {result['seconds'] * 1e6:12.2f} us/call"
+        if name in baseline:
+            ratio = result['seconds'] / baseline[name]['seconds']
+            line += f"  ({ratio:.2f}x baseline)"
+        print(line)
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(results, fp, indent=2, sort_keys=True)
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"Slower than baseline: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
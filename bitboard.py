@@ -0,0 +1,146 @@
+"""
+Scores hands held as bitboards instead of lists of cards
+A hand is a 52 bit mask with bit serialize() set for each card, laid out as
+four 13 bit rows, one per suit. Folding the rows gives a 13 slot rank count,
+and everything is worked out from those two:
+    15s by a subset sum over how many cards there are of each pip value
+    pairs from the rank counts
+    runs from the mask of ranks present
+    the flush and nobs from the suit rows
+This needs no precomputed table, see CribbageHand.count(backend='bitboard')
+"""
+from scoring import NUM_RANKS, NUM_SUITS, JACK, RANK_VALUES, PAIR_POINTS
+
+ROW = (1 << NUM_RANKS) - 1  # One suit's worth of bits
+COLUMN = sum(1 << (suit * NUM_RANKS) for suit in range(NUM_SUITS))  # Every Ace
+JACKS = COLUMN << JACK
+
+# The subset sum keeps the number of ways to make each total in its own
+# field of one int, wide enough for hands of up to 7 cards
+FIELD = 8
+FIELD_MASK = (1 << FIELD) - 1
+VALUE_SHIFTS = tuple(value * FIELD for value in RANK_VALUES)
+
+
+def _popcount(mask):
+    return bin(mask).count('1')
+
+
+def hand_mask(cards):
+    mask = 0
+    for card in cards:
+        mask |= card.mask
+    return mask
+
+
+def rank_counts(mask):
+    """
+    The 13 slot rank count of a hand mask
+    """
+    counts = [0] * NUM_RANKS
+    while mask:
+        low = mask & -mask
+        counts[(low.bit_length() - 1) % NUM_RANKS] += 1
+        mask ^= low
+    return counts
+
+
+def rank_mask(mask):
+    """
+    Bit rank is set if the hand holds any card of that rank
+    """
+    ranks = 0
+    for suit in range(NUM_SUITS):
+        ranks |= (mask >> (suit * NUM_RANKS)) & ROW
+    return ranks
+
+
+def fifteens(counts):
+    """
+    Points for 15s, from a subset sum over the rank counts
+    Field total of ways holds how many subsets of the cards seen so far add up
+    to total. Each card either stays out of a subset or adds its value to the
+    total, which is ways + (ways << its value's fields), so there is no
+    branching on the sums at all
+    """
+    ways = 1
+    for rank, num in enumerate(counts):
+        shift = VALUE_SHIFTS[rank]
+        for _ in range(num):
+            ways += ways << shift
+
+    return 2 * ((ways >> (15 * FIELD)) & FIELD_MASK)
+
+
+def pairs(counts):
+    return sum(PAIR_POINTS[num] for num in counts if num)
+
+
+def runs(counts, ranks):
+    """
+    Every maximal stretch of 3 or more ranks in a row scores its length times
+    the number of ways to pick one card of each rank
+    """
+    total = 0
+    while ranks:
+        low = high = ranks & -ranks
+        while (high << 1) & ranks:
+            high <<= 1
+        stretch = (high << 1) - low  # Every bit from low up to high
+        ranks &= ~stretch
+
+        length = _popcount(stretch)
+        if length >= 3:
+            multiplier = 1
+            first = low.bit_length() - 1
+            for rank in range(first, first + length):
+                multiplier *= counts[rank]
+            total += length * multiplier
+
+    return total
+
+
+def score_ranks(ranks):
+    """
+    15s, pairs and runs of a tuple of rank indexes, the same as
+    RANK_TABLE[tuple(sorted(ranks))]
+    """
+    counts = [0] * NUM_RANKS
+    present = 0
+    for rank in ranks:
+        counts[rank] += 1
+        present |= 1 << rank
+    return fifteens(counts) + pairs(counts) + runs(counts, present)
+
+
+def count_mask(mask, cut_mask=0, is_crib=False):
+    """
+    The same as CribbageHand.count() for the four card hand mask and the
+    cut card mask, 0 for no cut
+    """
+    full_mask = mask | cut_mask
+    counts = rank_counts(full_mask)
+    total = fifteens(counts) + pairs(counts) + runs(counts, rank_mask(full_mask))
+
+    # Flush, every card of the hand in one suit's row
+    num_cards = _popcount(mask)
+    for suit in range(NUM_SUITS):
+        shift = suit * NUM_RANKS
+        if _popcount((mask >> shift) & ROW) == num_cards:
+            if (cut_mask >> shift) & ROW:
+                total += 5
+            elif not is_crib:
+                total += 4
+            break
+
+    # Nobs, the Jack of the cut card's suit
+    if cut_mask and mask & JACKS:
+        cut_suit = (cut_mask.bit_length() - 1) // NUM_RANKS
+        if mask & (1 << (cut_suit * NUM_RANKS + JACK)):
+            total += 1
+
+    return total
+
+
+def count_cards(cards, cut_card=None, is_crib=False):
+    return count_mask(hand_mask(cards), 0 if cut_card is None else cut_card.mask, is_crib)
@@ -0,0 +1,105 @@
+"""
+Suits are interchangeable in Cribbage, so any two hands that only differ by
+relabeling the suits score the same. Hands (and the cards known to be dead)
+are mapped to one canonical labeling here so work can be shared between them
+"""
+import pickle
+from collections import OrderedDict
+
+NUM_SUITS = 4
+
+
+def canonicalize(cards, dead=()):
+    """
+    Relabels the suits of cards and dead so that isomorphic hands come out the
+    same. Suits are ordered by the ranks they hold in the hand, then by the
+    ranks they hold in the dead cards.
+
+    Returns (key, ids) where key is hashable and identical for every
+    isomorphic hand, and ids[i] is the serialized canonical card that cards[i]
+    was mapped to
+    """
+    hand_ranks = [[] for _ in range(NUM_SUITS)]
+    dead_ranks = [[] for _ in range(NUM_SUITS)]
+    for card in cards:
+        hand_ranks[card.suit_index].append(card.rank_index)
+    for card in dead:
+        dead_ranks[card.suit_index].append(card.rank_index)
+
+    signatures = [
+        (sorted(hand_ranks[suit]), sorted(dead_ranks[suit]))
+        for suit in range(NUM_SUITS)
+    ]
+    suit_order = sorted(range(NUM_SUITS), key=signatures.__getitem__, reverse=True)
+
+    relabel = [0] * NUM_SUITS
+    for new_suit, old_suit in enumerate(suit_order):
+        relabel[old_suit] = new_suit
+
+    ids = [relabel[card.suit_index] * 13 + card.rank_index for card in cards]
+    dead_ids = [relabel[card.suit_index] * 13 + card.rank_index for card in dead]
+
+    key = (tuple(sorted(ids)), tuple(sorted(dead_ids)))
+    return key, ids
+
+
+class CanonicalMemo:
+    """
+    A bounded LRU cache keyed on canonical hands
+    Keeps track of its hit rate and can be saved to disk between runs
+    """
+    def __init__(self, maxsize=2 ** 20):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+
+        self._cache = OrderedDict()
+
+    def get(self, key, compute):
+        """
+        Returns the value stored for key, calling compute() to fill it in on
+        a miss
+        """
+        cache = self._cache
+        try:
+            value = cache[key]
+        except KeyError:
+            self.misses += 1
+            value = compute()
+            cache[key] = value
+            if len(cache) > self.maxsize:
+                cache.popitem(last=False)
+        else:
+            self.hits += 1
+            cache.move_to_end(key)
+        return value
+
+    def clear(self):
+        self._cache.clear()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def dump(self, path):
+        with open(path, 'wb') as fp:
+            pickle.dump(dict(self._cache), fp)
+
+    def load(self, path):
+        """
+        Only load memos you wrote yourself, they are pickles
+        """
+        with open(path, 'rb') as fp:
+            self._cache.update(pickle.load(fp))
+
+    def __contains__(self, key):
+        """
+        Doesn't count as a lookup or refresh the entry
+        """
+        return key in self._cache
+
+    def __len__(self):
+        return len(self._cache)
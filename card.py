@@ -3,14 +3,25 @@ These class use a lot of crappy Cribbage assumptions
 None of them will work for non-Cribbage card games
 TODO: Everything is too slow, fasten it up
 """
-import math
 from collections import deque, Counter
-
 from itertools import combinations
 
+import numpy as np
+
 from util import powerset_min_len
+import scoring
+from scoring import (
+    PEGGING_LIMIT,
+    expected_rank_points,
+    expected_suit_points,
+    pegging_points,
+    score_hands,
+)
+from canonical import canonicalize, CanonicalMemo
+import bitboard
 
 import random
+import warnings
 
 
 class CribbageCard:
@@ -54,31 +65,62 @@ class CribbageCard:
         'King': 10,
     }
 
-    def __init__(self, rank, suit):
-        self.rank = rank
-        self.suit = suit
+    RANK_TO_INDEX = {rank: i for i, rank in enumerate(RANKS)}
+    SUIT_TO_INDEX = {suit: i for i, suit in enumerate(SUITS)}
 
-    @property
-    def value(self):
-        return self.RANK_TO_VAL[self.rank]
+    JACK = RANK_TO_INDEX['Jack']
+
+    # Every field is precomputed once, and there is only ever one instance of
+    # each card, so cards can be compared by identity
+    __slots__ = ('rank', 'suit', 'rank_index', 'suit_index', 'value', 'mask', 'id')
+
+    _TABLE = ()  # Indexed by serialize()
+    _ALL = ()    # In the order of all()
+
+    def __new__(cls, rank, suit):
+        return cls._TABLE[cls.SUIT_TO_INDEX[suit] * 13 + cls.RANK_TO_INDEX[rank]]
+
+    @classmethod
+    def _build_table(cls):
+        table = []
+        for num in range(52):
+            card = object.__new__(cls)
+            card.rank_index = num % 13
+            card.suit_index = num // 13
+            card.rank = cls.RANKS[card.rank_index]
+            card.suit = cls.SUITS[card.suit_index]
+            card.value = cls.RANK_TO_VAL[card.rank]
+            card.mask = 1 << num
+            card.id = num
+            table.append(card)
+
+        cls._TABLE = tuple(table)
+        cls._ALL = tuple(
+            table[suit_index * 13 + rank_index]
+            for rank_index in range(len(cls.RANKS))
+            for suit_index in range(len(cls.SUITS))
+        )
 
     @classmethod
     def all(cls):
-        return [
-            cls(rank, suit)
-            for rank in cls.RANKS
-            for suit in cls.SUITS
-        ]
+        return list(cls._ALL)
 
     def serialize(self) -> int:  # Gives the numeric
-        return self.SUITS.index(self.suit) * 13 + self.RANKS.index(self.rank)
+        return self.id
 
     @classmethod
     def deserialize(cls, num):
-        assert 0 <= num < 51
-        rank = cls.RANKS[num % 13]
-        suit = cls.SUITS[num // 13]
-        return cls(rank, suit)
+        assert 0 <= num < 52
+        return cls._TABLE[num]
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return self.__class__, (self.rank, self.suit)
 
     def __repr__(self):
         return f"{self.__class__.__name__}({self.rank}, {self.suit})"
@@ -87,6 +129,23 @@ class CribbageCard:
         return f"{self.rank} of {self.suit}"
 
 
+CribbageCard._build_table()
+
+ALL_CARDS_MASK = (1 << 52) - 1
+
+# predict() results for isomorphic situations. A key holds the dead cards too,
+# up to about 0.7KB an entry, so this tops out around 45MB in every process
+# that predicts, pool workers included
+PREDICT_MEMO = CanonicalMemo(2 ** 16)
+
+# Ways CribbageHand can score itself, they always agree:
+#     table     15s, pairs and runs looked up in RANK_TABLE, the fastest
+#     bitboard  worked out from the hand's bitboard, see bitboard.py
+#     numpy     scoring.score_hands(), predict() scores every fill up and cut
+#               card in one batch
+SCORING_BACKENDS = ('table', 'bitboard', 'numpy')
+
+
 class CribbageDeck:
     def __init__(self):
         self.card_cls = CribbageCard
@@ -94,9 +153,25 @@ class CribbageDeck:
         self.top = 0
         self.cards = self.card_cls.all()
 
-    def shuffle(self):
+    def shuffle(self, rng=random, num_cards=None):
+        """
+        Only the first num_cards are shuffled into place if it's given,
+        which is all that matters if no more than that will be drawn
+        """
         self.top = 0
-        random.shuffle(self.cards)
+        cards = self.cards
+
+        if num_cards is None:
+            rng.shuffle(cards)
+            return
+
+        # random() is several times cheaper than randrange(), and the bias
+        # from rounding a 53 bit float is far too small to matter
+        random_float = rng.random
+        num = len(cards)
+        for i in range(num_cards):
+            j = i + int(random_float() * (num - i))
+            cards[i], cards[j] = cards[j], cards[i]
 
     @property
     def remaining_cards(self):
@@ -112,10 +187,17 @@ class CribbageDeck:
         return card
 
     def deal(self, num_cards):
-        return [self.draw() for _ in range(num_cards)]
+        top = self.top
+        if top + num_cards > len(self.cards):
+            raise ValueError("Out of cards!")
+
+        self.top = top + num_cards
+        return self.cards[top:top + num_cards]
 
 
 class CribbageHand:
+    backend = 'table'  # Used when count() and predict() aren't given one
+
     def __init__(self, cards=None):
         if cards is None:
             cards = []
@@ -132,7 +214,56 @@ class CribbageHand:
         self.cards.remove(card)
         return card
 
-    def count(self, cut_card=None):
+    def count(self, cut_card=None, is_crib=False, backend=None):
+        """
+        15s, pairs and runs come from a table keyed by the sorted ranks,
+        the flush and nobs are added on from the suits.
+        A crib only scores a flush if the cut card matches it too.
+        backend picks another way of scoring, see SCORING_BACKENDS
+        """
+        assert len(self.cards) == 4
+
+        cards = self.cards
+
+        backend = backend or self.backend
+        if backend != 'table':
+            if backend == 'bitboard':
+                return bitboard.count_cards(cards, cut_card, is_crib)
+            if backend == 'numpy':
+                if cut_card is None:
+                    raise ValueError("The numpy backend needs a cut card")
+                row = [[card.id for card in cards] + [cut_card.id]]
+                return int(score_hands(row, [is_crib])[0])
+            raise ValueError(f"Unknown scoring backend {backend}")
+
+        ranks = [card.rank_index for card in cards]
+        if cut_card is not None:
+            ranks.append(cut_card.rank_index)
+        ranks.sort()
+
+        total = scoring.RANK_TABLE[tuple(ranks)]
+
+        # Flush
+        suit_index = cards[0].suit_index
+        if all(card.suit_index == suit_index for card in cards):
+            if cut_card is not None and cut_card.suit_index == suit_index:
+                total += 5
+            elif not is_crib:
+                total += 4
+
+        # Knobs
+        if cut_card is not None:
+            for card in cards:
+                if card.rank_index == CribbageCard.JACK and \
+                        card.suit_index == cut_card.suit_index:
+                    total += 1
+
+        return total
+
+    def _count_reference(self, cut_card=None, is_crib=False):
+        """
+        The original scorer, kept around to check the table against
+        """
         assert len(self.cards) == 4
 
         cards = self.cards[:]
@@ -157,14 +288,15 @@ class CribbageHand:
 
         # Flush
         if len(suit_counter) == 1:
-            total += 4
-            if cut_card.suit in suit_counter.keys():
-                total += 1
+            if cut_card is not None and cut_card.suit in suit_counter.keys():
+                total += 5
+            elif not is_crib:
+                total += 4
 
         # Runs
         num_in_a_row = 0
         multiplier = 1
-        for rank in CribbageCard.RANKS:
+        for rank in CribbageCard.RANKS + [None]:  # None ends a run of Kings
             if rank in rank_counter:
                 num_in_a_row += 1
                 multiplier *= rank_counter[rank]
@@ -177,38 +309,122 @@ class CribbageHand:
 
         # Knobs
         jack_suits = [card.suit for card in self.cards if card.rank == 'Jack']
-        if cut_card.suit in jack_suits:
+        if cut_card is not None and cut_card.suit in jack_suits:
             total += 1
 
         return total
 
-    def predict(self, remaining_cards: list, quality: float = 1.0):
+    def predict(self, remaining_cards: list, quality: float = 1.0, rng=random,
+                is_crib=False, backend=None):
         """
         Uses statistical analysis to assign a number value to these cards
-        denoting their point value. The higher quality is, the longer a
-        prediction takes to complete
+        denoting their point value, which is the average count once the hand
+        is filled up to four cards from remaining_cards and a cut card is
+        drawn from what is left. The average is always exact: the closed form
+        is faster than sampling even a small fraction of the draws, so quality
+        and rng are deprecated and ignored.
+        is_crib and backend are passed on to count()
         """
-        orig_cards = self.cards
-
         assert len(self.cards) <= 4
-        assert 0 < quality <= 1.0
+        if quality != 1.0 or rng is not random:
+            warnings.warn(
+                "predict() is always exact, quality and rng are ignored",
+                DeprecationWarning,
+                stacklevel=2,
+            )
+
+        backend = backend or self.backend
+        if backend not in SCORING_BACKENDS:
+            raise ValueError(f"Unknown scoring backend {backend}")
+
+        cards = self.cards
+
+        # Whatever isn't in the hand or left to draw is dead
+        dead_mask = ALL_CARDS_MASK
+        for card in cards:
+            dead_mask ^= card.mask
+        for card in remaining_cards:
+            dead_mask ^= card.mask
+
+        dead = []
+        while dead_mask:
+            low_bit = dead_mask & -dead_mask
+            dead.append(CribbageCard.deserialize(low_bit.bit_length() - 1))
+            dead_mask ^= low_bit
+
+        key, _ = canonicalize(cards, dead)
+        if is_crib:
+            key += ('crib',)
+        if backend != 'table':  # Kept apart so backends can be compared
+            key += (backend,)
+
+        if backend == 'numpy':
+            return PREDICT_MEMO.get(
+                key, lambda: self._predict_enumerated(remaining_cards, is_crib),
+            )
+        return PREDICT_MEMO.get(
+            key, lambda: self._predict_exact(remaining_cards, is_crib, backend),
+        )
+
+    def _predict_exact(self, remaining_cards, is_crib=False, backend='table'):
+        cards = self.cards
+        num_fill = 4 - len(cards)
+        assert len(remaining_cards) > num_fill
+
+        rank_counts = [0] * len(CribbageCard.RANKS)
+        suit_counts = [0] * len(CribbageCard.SUITS)
+        remaining_jack_suits = []
+        for card in remaining_cards:
+            rank_counts[card.rank_index] += 1
+            suit_counts[card.suit_index] += 1
+            if card.rank_index == CribbageCard.JACK:
+                remaining_jack_suits.append(card.suit_index)
+
+        rank_points = expected_rank_points(
+            tuple(sorted(card.rank_index for card in cards)),
+            tuple(rank_counts),
+            num_fill,
+            bitboard.score_ranks if backend == 'bitboard' else None,
+        )
+
+        suit_points = expected_suit_points(
+            [card.suit_index for card in cards],
+            [card.suit_index for card in cards if card.rank_index == CribbageCard.JACK],
+            suit_counts,
+            remaining_jack_suits,
+            num_fill,
+            is_crib,
+        )
+
+        return rank_points + suit_points
+
+    def _predict_enumerated(self, remaining_cards, is_crib=False):
+        """
+        The same as _predict_exact(), by scoring every fill up and cut card
+        with score_hands()
+        """
+        num_known = len(self.cards)
+        num_fill = 4 - num_known
+        assert len(remaining_cards) > num_fill
+
+        remaining_ids = np.array([card.id for card in remaining_cards], dtype=np.int8)
+        num_remaining = len(remaining_ids)
 
-        remaining_cards = remaining_cards[:math.ceil(len(remaining_cards) * quality)]
+        fills = list(combinations(range(num_remaining), num_fill))
+        fills = np.array(fills, dtype=np.intp).reshape(len(fills), num_fill)
 
-        num = 0
-        total_count = 0
+        # Every card not in the fill up can be cut
+        cuts = np.arange(num_remaining)
+        can_cut = ~(cuts[None, :, None] == fills[:, None, :]).any(axis=2)
+        fill_rows, cut_indexes = np.nonzero(can_cut)
 
-        for fillup in combinations(remaining_cards, 4 - len(self.cards)):
-            self.cards = orig_cards + list(fillup)
-            rest = remaining_cards[:]
-            for card in fillup:
-                rest.remove(card)
-            for cut_card in rest:
-                num += 1
-                count = self.count(cut_card)
-                total_count += count
+        hands = np.empty((len(fill_rows), 5), dtype=np.int8)
+        hands[:, :num_known] = [card.id for card in self.cards]
+        hands[:, num_known:4] = remaining_ids[fills[fill_rows]]
+        hands[:, 4] = remaining_ids[cut_indexes]
 
-        return total_count / num
+        is_crib = np.full(len(hands), is_crib)
+        return float(score_hands(hands, is_crib).mean())
 
     def __getitem__(self, index) -> CribbageCard:
         return self.cards[index - 1]
@@ -224,55 +440,61 @@ class CribbageHand:
 
 
 class CribbagePeggingPile:
-    PEGGING_LIMIT = 31
+    PEGGING_LIMIT = PEGGING_LIMIT
 
     def __init__(self):
-        self.cards = deque()
+        self.clear()
 
-    def _scored_points(self):
+    def clear(self):
         """
-        Return the number of points the top card would score
+        Starts a new hand, forgetting every card pegged so far
         """
-        points = 0
-
-        num_cards = len(self)
-        count = self.count()
-
-        # FIND 15 and 31 POINTS
-        if count == 15:
-            print("15 for 2")
-            points += 2
-        elif count == 31:
-            print("31 for 2")
-            points += 2
-
-        # FIND SEQUENCE POINTS
-        sequence_points = 0
-
-        for i in range(3, num_cards + 1):
-            card_ranks = [
-                # TODO: Find a good way to refactor this
-                CribbageCard.RANKS.index(card.rank)
-                for card in list(self)[num_cards - i::]
-            ]
-            card_ranks.sort()
-            if len(set(card_ranks)) == len(card_ranks):  # No duplicates
-                if card_ranks[-1] - card_ranks[0] == len(card_ranks):
-                    sequence_points = len(card_ranks)
-
-        points += sequence_points
-
-        return points
+        self.history = []  # Every card pegged this hand, across resets
+        self.gos = []  # (player, count) for every go said this hand
+        self.reset()
 
     def reset(self):
         self.cards = deque()
 
+        # Kept up to date as cards are added, so scoring never rescans the pile
+        self._count = 0
+        self._ranks = []  # Rank indexes in the order they were played
+        self._num_same_rank = 0  # How many cards on top share the top rank
+
+    def points_for(self, card):
+        """
+        Return the number of points card would score if it was added
+        """
+        return pegging_points(self._ranks, self._count, card.rank_index, self._num_same_rank)
+
     def add(self, card):
+        """
+        Puts card on the pile and returns the number of points it scored
+        """
+        ranks = self._ranks
+        rank = card.rank_index
+        points = pegging_points(ranks, self._count, rank, self._num_same_rank)
+
+        if ranks and ranks[-1] == rank:
+            self._num_same_rank += 1
+        else:
+            self._num_same_rank = 1
+
+        ranks.append(rank)
+        self._count += card.value
         self.cards.append(card)
-        return self._scored_points()
+        self.history.append(card)
+
+        return points
+
+    def say_go(self, player):
+        """
+        Remembers that player couldn't play onto the pile at its count
+        """
+        self.gos.append((player, self._count))
 
     def count(self):
-        return sum(card.value for card in self.cards)
+        return self._count
 
     def min_required(self):
         return self.PEGGING_LIMIT - self.count()
@@ -0,0 +1,97 @@
+"""
+Expected crib points for every pair of cards that can be thrown into it
+Only the ranks of the two cards and whether they share a suit matter, so the
+table is indexed [low rank][high rank][suited] and is small enough to keep in
+a .npy file. It assumes the other player throws two random cards and that
+none of the thrower's own cards are known, so it is a fast approximation of
+what discard.split_values() works out exactly. The crib counts for the dealer
+and against the pone, so dealer status is only the sign
+"""
+import os
+
+import numpy as np
+
+from card import CribbageCard, CribbageHand
+from scoring import NUM_RANKS
+from util import save_npy_atomic
+
+CRIB_TABLE = 'crib_table.npy'
+
+# (table, table_key()) for every table loaded by this process, by absolute path
+_TABLES = {}
+
+
+def gen_crib_table():
+    """
+    The exact expected crib for each pair of ranks, suited and not, with the
+    other 50 cards unseen. A pair of the same rank can't be suited, both
+    entries hold its value
+    """
+    table = np.zeros((NUM_RANKS, NUM_RANKS, 2))
+    all_cards = CribbageCard.all()
+    spades, hearts = CribbageCard.SUITS[:2]
+
+    for low in range(NUM_RANKS):
+        for high in range(low, NUM_RANKS):
+            for suited in (0, 1):
+                second_suit = spades if suited and low != high else hearts
+                thrown = [
+                    CribbageCard(CribbageCard.RANKS[low], spades),
+                    CribbageCard(CribbageCard.RANKS[high], second_suit),
+                ]
+                remaining_cards = [card for card in all_cards if card not in thrown]
+                value = CribbageHand(thrown).predict(remaining_cards, is_crib=True)
+                table[low, high, suited] = table[high, low, suited] = value
+
+    return table
+
+
+def save_crib_table(path=CRIB_TABLE):
+    table = gen_crib_table()
+    save_npy_atomic(path, table)
+    _TABLES.pop(os.path.abspath(path), None)
+    return table
+
+
+def load_crib_table(path=CRIB_TABLE):
+    """
+    Loads a table once per process
+    """
+    key = os.path.abspath(path)
+    try:
+        return _TABLES[key][0]
+    except KeyError:
+        table = np.load(path)
+        _TABLES[key] = (table, _hash_table(table))
+        return table
+
+
+def _hash_table(table):
+    return hash(np.asarray(table).tobytes())
+
+
+def table_key(table):
+    """
+    Tells tables apart by their contents, for keying memos. Worked out once
+    when a table is loaded, tables made some other way are hashed each call
+    """
+    for loaded, key in _TABLES.values():
+        if loaded is table:
+            return key
+    return _hash_table(table)
+
+
+def crib_value(table, thrown):
+    first, second = thrown
+    suited = int(first.suit_index == second.suit_index)
+    return float(table[first.rank_index, second.rank_index, suited])
+
+
+def main():
+    table = save_crib_table()
+    best = np.unravel_index(np.argmax(table), table.shape)
+    print(f"Wrote {CRIB_TABLE}, best pair {best} is worth {table[best]:.3f}")
+
+
+if __name__ == '__main__':
+    main()
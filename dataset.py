@@ -0,0 +1,368 @@
+"""
+Generates, stores and loads the throwing dataset
+Work is split into shards with their own seeds, so shards can be run on a
+process pool in any order, and a crashed or interrupted run picks up where it
+left off
+
+Besides CSV the dataset can be stored in a compact binary format:
+    header   magic, version, flags, number of rows (see HEADER)
+    records  RECORD_DTYPE[num_rows], or VALUES_RECORD_DTYPE[num_rows] when
+             FLAG_VALUES is set, which also stores the value of every discard
+             in discard.DISCARDS order
+The records can be memory-mapped straight off the disk
+
+Datasets can also be streamed as fixed-size batches of records, see
+stream_batches(), so they can be written and trained on as they are made
+without ever holding the whole thing in memory
+"""
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import random
+import struct
+from collections import deque
+from itertools import islice
+
+import numpy as np
+
+import discard
+from card import CribbageDeck
+from discard import DISCARDS
+
+logger = logging.getLogger(__name__)
+
+DATASET_CSV = 'throwing_dataset.csv'
+DATASET_BIN = 'throwing_dataset.bin'
+SHARD_DIR = 'throwing_shards'
+MANIFEST = 'manifest.json'
+
+MAGIC = b'CRIBTHRW'
+VERSION = 1
+HEADER = struct.Struct('<8sIIQ')
+FLAG_VALUES = 1
+
+RECORD_DTYPE = np.dtype([
+    ('is_dealer', 'u1'),
+    ('cards', 'u1', (6,)),
+    ('thrown', 'u1', (2,)),
+])
+VALUES_RECORD_DTYPE = np.dtype(RECORD_DTYPE.descr + [
+    ('values', '<f4', (len(DISCARDS),)),
+])
+
+
+def deal_rows(num_rows, rng=random, with_values=False):
+    """
+    Yields dataset rows: whether you're dealing, the six cards dealt and the
+    indexes of the two that are best to throw. With with_values the value of
+    every discard, in DISCARDS order, is tacked onto the end
+    """
+    deck = CribbageDeck()
+
+    for i in range(num_rows):
+        is_dealer = i % 2
+
+        deck.shuffle(rng)
+        full_hand = deck.deal(6)
+
+        results = discard.optimal_discard(full_hand, is_dealer)
+
+        row = [
+            is_dealer,
+            *[card.serialize() for card in full_hand],
+            *results[0][1],
+        ]
+        if with_values:
+            values = dict((thrown, value) for value, thrown in results)
+            row.extend(values[thrown] for thrown in DISCARDS)
+
+        yield row
+
+
+def _record(row, with_values):
+    row = list(row)
+    record = (row[0], row[1:7], row[7:9])
+    if with_values:
+        record += (row[9:],)
+    return record
+
+
+def _deal_batch(args):
+    seed, batch, batch_rows, with_values = args
+    rows = deal_rows(batch_rows, _shard_rng(seed, batch), with_values)
+    dtype = VALUES_RECORD_DTYPE if with_values else RECORD_DTYPE
+    return np.array([_record(row, with_values) for row in rows], dtype=dtype)
+
+
+def stream_batches(num_rows=None, batch_rows=4096, seed=0, with_values=True,
+                   processes=1):
+    """
+    Yields batches of batch_rows freshly dealt records, structured arrays of
+    VALUES_RECORD_DTYPE (or RECORD_DTYPE without with_values), until num_rows
+    rows have been made or forever if num_rows is None
+    With more than one process the batches are dealt on a pool, a few at a
+    time so memory stays flat however slowly they are used up. The batches
+    come out the same either way
+    """
+    if num_rows is None:
+        sizes = iter(lambda: batch_rows, None)
+    else:
+        sizes = (
+            min(batch_rows, num_rows - start)
+            for start in range(0, num_rows, batch_rows)
+        )
+    jobs = ((seed, batch, size, with_values) for batch, size in enumerate(sizes))
+
+    if processes == 1:
+        for job in jobs:
+            yield _deal_batch(job)
+        return
+
+    processes = processes or os.cpu_count() or 1
+    with multiprocessing.Pool(processes) as pool:
+        pending = deque()
+        for job in jobs:
+            pending.append(pool.apply_async(_deal_batch, (job,)))
+            if len(pending) >= 2 * processes:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def read_batches(path, batch_rows=4096):
+    """
+    Yields an existing dataset as batches of records like stream_batches()
+    Binary datasets are memory-mapped, CSV ones are read batch_rows at a time
+    """
+    if not path.endswith('.csv'):
+        data = load_dataset(path)
+        for start in range(0, len(data), batch_rows):
+            yield np.array(data[start:start + batch_rows])
+        return
+
+    with open(path, newline='') as fp:
+        reader = csv.reader(fp)
+        while True:
+            rows = [[int(field) for field in row] for row in islice(reader, batch_rows)]
+            if not rows:
+                return
+            with_values = len(rows[0]) > 9
+            dtype = VALUES_RECORD_DTYPE if with_values else RECORD_DTYPE
+            yield np.array([_record(row, with_values) for row in rows], dtype=dtype)
+
+
+def write_batches(batches, writer):
+    """
+    Passes batches through unchanged, writing each one to a DatasetWriter on
+    the way, so a stream can be saved and trained on at the same time
+    """
+    for batch in batches:
+        writer.write_batch(batch)
+        yield batch
+
+
+def batch_features(batch):
+    """
+    (features, thrown) of a batch of records, where features is
+    [is_dealer, *cards] and thrown holds the two indexes thrown
+    """
+    features = np.column_stack((batch['is_dealer'], batch['cards']))
+    return features, np.asarray(batch['thrown'])
+
+
+class DatasetWriter:
+    """
+    Writes rows in the binary format. The file only appears at path, complete,
+    once the writer is closed
+    """
+    def __init__(self, path=DATASET_BIN, with_values=False, chunk_rows=65536):
+        self.path = path
+        self.dtype = VALUES_RECORD_DTYPE if with_values else RECORD_DTYPE
+        self.flags = FLAG_VALUES if with_values else 0
+        self.chunk_rows = chunk_rows
+        self.num_rows = 0
+
+        self._tmp_path = f"{path}.tmp"
+        self._fp = open(self._tmp_path, 'wb')
+        self._fp.write(HEADER.pack(MAGIC, VERSION, self.flags, 0))
+        self._chunk = []
+
+    def writerow(self, row):
+        self._chunk.append(_record(row, self.flags & FLAG_VALUES))
+        if len(self._chunk) >= self.chunk_rows:
+            self._flush()
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def write_batch(self, batch):
+        """
+        Writes a structured array of records in one go
+        """
+        self._flush()
+        self._fp.write(np.asarray(batch, dtype=self.dtype).tobytes())
+        self.num_rows += len(batch)
+
+    def _flush(self):
+        if self._chunk:
+            self._fp.write(np.array(self._chunk, dtype=self.dtype).tobytes())
+            self.num_rows += len(self._chunk)
+            self._chunk = []
+
+    def close(self):
+        self._flush()
+        self._fp.seek(0)
+        self._fp.write(HEADER.pack(MAGIC, VERSION, self.flags, self.num_rows))
+        self._fp.close()
+        os.replace(self._tmp_path, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:  # Don't leave a half written dataset lying around
+            self._fp.close()
+            os.remove(self._tmp_path)
+
+
+def load_dataset(path=DATASET_BIN):
+    """
+    Memory-maps a binary dataset as a structured array without copying it
+    """
+    with open(path, 'rb') as fp:
+        magic, version, flags, num_rows = HEADER.unpack(fp.read(HEADER.size))
+
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a version {VERSION} throwing dataset")
+
+    dtype = VALUES_RECORD_DTYPE if flags & FLAG_VALUES else RECORD_DTYPE
+    if num_rows == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', offset=HEADER.size, shape=(num_rows,))
+
+
+def load_training_data(path):
+    """
+    Returns (features, thrown) from either a CSV or a binary dataset, where
+    features is [is_dealer, *cards] and thrown holds the two indexes thrown
+    """
+    if path.endswith('.csv'):
+        data = np.loadtxt(path, delimiter=',', dtype=np.uint8, ndmin=2)
+        return data[:, :-2], data[:, -2:]
+
+    return batch_features(load_dataset(path))
+
+
+def csv_to_binary(csv_path=DATASET_CSV, bin_path=DATASET_BIN):
+    with open(csv_path, newline='') as fp, DatasetWriter(bin_path) as writer:
+        for row in csv.reader(fp):
+            writer.writerow(int(field) for field in row)
+    return writer.num_rows
+
+
+def _shard_rng(seed, shard):
+    return random.Random(seed * 2 ** 32 + shard)
+
+
+def _shard_path(out_dir, shard):
+    return os.path.join(out_dir, f"shard-{shard:05d}.csv")
+
+
+def _write_atomic(path, write):
+    """
+    Calls write(fp) on a temporary file, then moves it over path so readers
+    only ever see a complete file
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', newline='') as fp:
+        write(fp)
+    os.replace(tmp_path, path)
+
+
+def _gen_shard(args):
+    out_dir, seed, shard, shard_size = args
+
+    def write(fp):
+        csv.writer(fp).writerows(deal_rows(shard_size, _shard_rng(seed, shard)))
+
+    _write_atomic(_shard_path(out_dir, shard), write)
+    return shard
+
+
+def _load_manifest(out_dir, seed, shard_size):
+    path = os.path.join(out_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {'seed': seed, 'shard_size': shard_size, 'completed': []}
+
+    with open(path) as fp:
+        manifest = json.load(fp)
+
+    if manifest['seed'] != seed or manifest['shard_size'] != shard_size:
+        raise ValueError(
+            f"{out_dir} was generated with seed {manifest['seed']} and "
+            f"shard_size {manifest['shard_size']}"
+        )
+    return manifest
+
+
+def _save_manifest(out_dir, manifest):
+    _write_atomic(os.path.join(out_dir, MANIFEST), lambda fp: json.dump(manifest, fp))
+
+
+def gen_dataset_sharded(num_rows, out_dir=SHARD_DIR, shard_size=10000,
+                        seed=0, processes=None):
+    """
+    Generates num_rows rows (rounded up to whole shards) into out_dir
+    Shards already listed in the manifest are skipped, so running this again
+    with the same arguments resumes an interrupted run
+    """
+    os.makedirs(out_dir, exist_ok=True)
+
+    manifest = _load_manifest(out_dir, seed, shard_size)
+    completed = set(manifest['completed'])
+
+    num_shards = -(-num_rows // shard_size)
+    todo = [
+        (out_dir, seed, shard, shard_size)
+        for shard in range(num_shards)
+        if shard not in completed or not os.path.exists(_shard_path(out_dir, shard))
+    ]
+
+    with multiprocessing.Pool(processes) as pool:
+        for shard in pool.imap_unordered(_gen_shard, todo):
+            completed.add(shard)
+            manifest['completed'] = sorted(completed)
+            _save_manifest(out_dir, manifest)
+            logger.info(f"Shard {shard} done ({len(completed)}/{num_shards})")
+
+    return num_shards
+
+
+def merge_shards(out_dir=SHARD_DIR, path=DATASET_CSV):
+    """
+    Concatenates every completed shard, in shard order, into path
+    A path ending in .bin is written in the binary format
+    """
+    with open(os.path.join(out_dir, MANIFEST)) as fp:
+        manifest = json.load(fp)
+
+    if not path.endswith('.csv'):
+        with DatasetWriter(path) as writer:
+            for shard in manifest['completed']:
+                with open(_shard_path(out_dir, shard), newline='') as shard_fp:
+                    for row in csv.reader(shard_fp):
+                        writer.writerow(int(field) for field in row)
+        return len(manifest['completed'])
+
+    def write(fp):
+        for shard in manifest['completed']:
+            with open(_shard_path(out_dir, shard), newline='') as shard_fp:
+                fp.write(shard_fp.read())
+
+    _write_atomic(path, write)
+    return len(manifest['completed'])
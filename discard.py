@@ -0,0 +1,232 @@
+"""
+Works out which two cards are best to throw into the crib
+All 15 discards are worked out together: the 46 cards left over are the same
+for every one of them, so the cut cards and the crib's fill ups are only
+enumerated once per hand, and discards that throw the same ranks share their
+crib. Isomorphic hands then share one evaluation through a memo keyed on the
+canonical hand, so repeated deals cost a single lookup
+"""
+from functools import lru_cache
+from itertools import combinations
+
+import numpy as np
+
+from card import CribbageCard, CribbageHand
+from canonical import canonicalize, CanonicalMemo
+from crib_table import crib_value, table_key
+import scoring
+from scoring import (
+    NUM_RANKS,
+    rank_array_index,
+    expected_suit_points,
+    fill_ups,
+)
+
+# Every pair of indexes that can be thrown from a six card hand
+DISCARDS = list(combinations(range(6), 2))
+
+# Each entry is a 15 x 2 array, about 0.7KB with its key, so this tops out
+# around 50MB in every process that makes discards, pool workers included
+DISCARD_MEMO = CanonicalMemo(2 ** 16)
+
+
+@lru_cache(maxsize=4096)
+def _crib_draws(rank_counts):
+    """
+    The ranks of the other player's two cards and the cut, drawn from a deck
+    holding rank_counts[rank] cards of each rank, as (M x 3 array of sorted
+    ranks, M weights summing to 1)
+    Only the ranks matter to 15s, pairs and runs, so draws with the same
+    three ranks are added together
+    """
+    weights = {}
+    for fill, ways in fill_ups(rank_counts, 2):
+        for cut_rank in range(NUM_RANKS):
+            cut_ways = rank_counts[cut_rank] - fill.count(cut_rank)
+            if cut_ways > 0:
+                ranks = tuple(sorted(fill + (cut_rank,)))
+                weights[ranks] = weights.get(ranks, 0) + ways * cut_ways
+
+    draws = np.array(list(weights), dtype=np.intp)
+    weights = np.array(list(weights.values()), dtype=np.float64)
+    return draws, weights / weights.sum()
+
+
+def _expected_ranks(known_ranks, draws, weights):
+    """
+    Expected 15s, pairs and runs of each row of known_ranks completed by each
+    row of draws, weighted by weights
+    """
+    num_known, num_draws = len(known_ranks), len(draws)
+    ranks = np.empty((num_known, num_draws, 5), dtype=np.intp)
+    ranks[:, :, :known_ranks.shape[1]] = known_ranks[:, None, :]
+    ranks[:, :, known_ranks.shape[1]:] = draws[None, :, :]
+    ranks.sort(axis=2)
+    return scoring.RANK_ARRAY[rank_array_index(ranks)] @ weights
+
+
+def split_values(full_hand, crib_table=None):
+    """
+    (hand, crib) expected points for each of DISCARDS thrown from full_hand,
+    with every other card in the deck unseen. The same as predict() on each
+    kept hand and crib, but with the enumeration shared between them.
+    With a table from crib_table.py the cribs are looked up in it instead
+    """
+    remaining_cards = [card for card in CribbageCard.all() if card not in full_hand]
+
+    rank_counts = [0] * NUM_RANKS
+    suit_counts = [0] * len(CribbageCard.SUITS)
+    remaining_jack_suits = []
+    for card in remaining_cards:
+        rank_counts[card.rank_index] += 1
+        suit_counts[card.suit_index] += 1
+        if card.rank_index == CribbageCard.JACK:
+            remaining_jack_suits.append(card.suit_index)
+
+    kept_hands = [
+        [card for i, card in enumerate(full_hand) if i not in thrown_indexes]
+        for thrown_indexes in DISCARDS
+    ]
+    cribs = [[full_hand[i] for i in thrown_indexes] for thrown_indexes in DISCARDS]
+
+    # Hands, every one of them against the same cut cards
+    cut_draws = np.arange(NUM_RANKS)[:, None]
+    cut_weights = np.array(rank_counts, dtype=np.float64) / len(remaining_cards)
+    hand_ranks = np.array([[card.rank_index for card in kept] for kept in kept_hands])
+    hand_points = _expected_ranks(hand_ranks, cut_draws, cut_weights)
+
+    # Cribs, only once for each pair of ranks thrown
+    if crib_table is None:
+        crib_ranks = sorted({tuple(sorted(card.rank_index for card in crib)) for crib in cribs})
+        draws, weights = _crib_draws(tuple(rank_counts))
+        crib_rank_points = dict(zip(
+            crib_ranks, _expected_ranks(np.array(crib_ranks), draws, weights).tolist(),
+        ))
+
+    values = []
+    for kept, crib, rank_points in zip(kept_hands, cribs, hand_points.tolist()):
+        avg_hand = rank_points + expected_suit_points(
+            [card.suit_index for card in kept],
+            [card.suit_index for card in kept if card.rank_index == CribbageCard.JACK],
+            suit_counts,
+            remaining_jack_suits,
+            0,
+        )
+
+        if crib_table is not None:
+            values.append((avg_hand, crib_value(crib_table, crib)))
+            continue
+
+        avg_crib = crib_rank_points[tuple(sorted(card.rank_index for card in crib))] + \
+            expected_suit_points(
+                [card.suit_index for card in crib],
+                [card.suit_index for card in crib if card.rank_index == CribbageCard.JACK],
+                suit_counts,
+                remaining_jack_suits,
+                2,
+                True,
+            )
+        values.append((avg_hand, avg_crib))
+
+    return tuple(values)
+
+
+def _discard_values(canonical_ids, backend=None, crib_table=None):
+    """
+    (hand, crib) expected points for each of DISCARDS thrown from a canonical
+    hand. Without a backend this is split_values(), otherwise every hand and
+    crib is predicted on its own with that backend
+    """
+    full_hand = [CribbageCard.deserialize(num) for num in canonical_ids]
+    if backend is None:
+        return split_values(full_hand, crib_table)
+
+    remaining_cards = [card for card in CribbageCard.all() if card not in full_hand]
+
+    values = []
+    for thrown_indexes in DISCARDS:
+        kept = [card for i, card in enumerate(full_hand) if i not in thrown_indexes]
+        thrown = [full_hand[i] for i in thrown_indexes]
+
+        avg_hand = CribbageHand(kept).predict(remaining_cards, backend=backend)
+        if crib_table is not None:
+            avg_crib = crib_value(crib_table, thrown)
+        else:
+            avg_crib = CribbageHand(thrown).predict(
+                remaining_cards, is_crib=True, backend=backend,
+            )
+        values.append((avg_hand, avg_crib))
+
+    return tuple(values)
+
+
+def optimal_discard(full_hand, is_dealer, backend=None, crib_table=None, crib_key=None):
+    """
+    Returns (value, thrown indexes) for every way of throwing two cards from
+    full_hand, best first. Everything that needs discards worked out calls
+    this, from making datasets to playing. The value is the expected points
+    of the hand, plus the crib for the dealer or minus it for the other player.
+    backend is how hands get scored, see card.SCORING_BACKENDS. They all agree,
+    so values are shared between them.
+    crib_table approximates the cribs with a table from crib_table.py. Its
+    values are memoized apart from the exact ones, and apart from any other
+    table's by crib_key, crib_table.table_key() if it isn't given
+    """
+    assert len(full_hand) == 6
+
+    (canonical_ids, _), ids = canonicalize(full_hand)
+    key = canonical_ids
+    if crib_table is not None:
+        if crib_key is None:
+            crib_key = table_key(crib_table)
+        key += ('crib_table', crib_key)
+    values = DISCARD_MEMO.get(
+        key, lambda: np.array(_discard_values(canonical_ids, backend, crib_table)),
+    )
+
+    if is_dealer:
+        discard_values = values[:, 0] + values[:, 1]
+    else:
+        discard_values = values[:, 0] - values[:, 1]
+
+    return rank_discards(canonical_ids, ids, discard_values.tolist())
+
+
+evaluate_discards = optimal_discard  # What it used to be called
+
+
+def rank_discards(canonical_ids, ids, discard_values):
+    """
+    Maps the values of DISCARDS thrown from a canonical hand back onto the
+    hand canonicalize() was given, as (value, thrown indexes) best first
+    """
+    # Canonical position -> index in the original hand
+    to_index = {canonical_ids.index(num): i for i, num in enumerate(ids)}
+
+    results = [
+        (float(value), tuple(sorted((to_index[first], to_index[second]))))
+        for (first, second), value in zip(DISCARDS, discard_values)
+    ]
+
+    results.sort(key=lambda result: result[0], reverse=True)
+    return results
+
+
+def best_discard(full_hand, is_dealer):
+    """
+    Indexes of the two cards in full_hand that are best to throw
+    """
+    return optimal_discard(full_hand, is_dealer)[0][1]
+
+
+def discard_value(full_hand, thrown_indexes, is_dealer, backend=None, crib_table=None,
+                  crib_key=None):
+    """
+    Expected value of throwing the cards at thrown_indexes from full_hand
+    """
+    thrown_indexes = tuple(sorted(int(i) for i in thrown_indexes))
+    results = optimal_discard(full_hand, is_dealer, backend, crib_table, crib_key)
+    for value, indexes in results:
+        if indexes == thrown_indexes:
+            return value
+    raise ValueError(f"Can't throw {thrown_indexes}")
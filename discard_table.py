@@ -0,0 +1,189 @@
+"""
+One-time offline job that works out the exact value of every discard from
+every canonical six card deal (962,988 of them), for both the dealer and the
+pone, and stores it so the best discard is a binary search away
+
+File layout, little endian:
+    header  magic, version, reserved, number of records (see HEADER)
+    keys    uint64[num_records], sorted encoded canonical hands
+    values  float32[num_records, 2, 15], indexed [is_dealer][discard] with the
+            discards in discard.DISCARDS order
+"""
+import logging
+import multiprocessing
+import os
+import struct
+
+import numpy as np
+
+from card import CribbageCard
+from canonical import canonicalize
+from discard import DISCARDS, _discard_values, rank_discards
+from scoring import rank_multisets, NUM_SUITS
+
+logger = logging.getLogger(__name__)
+
+DISCARD_TABLE = 'discard_table.bin'
+
+MAGIC = b'CRIBDTAB'
+VERSION = 2  # 2 scores crib flushes by the crib rule
+HEADER = struct.Struct('<8sIIQ')
+
+
+def encode_key(canonical_ids):
+    """
+    Packs a sorted canonical hand into one integer, 6 bits per card
+    """
+    key = 0
+    for num in canonical_ids:
+        key = key << 6 | num
+    return key
+
+
+def _suit_assignments(ranks, suits=()):
+    """
+    Yields suits for each of the sorted ranks so no card repeats, only ever
+    using a new suit after all the lower ones. Any other assignment is a
+    relabeling of one of these
+    """
+    i = len(suits)
+    if i == len(ranks):
+        yield suits
+        return
+
+    taken = {suit for rank, suit in zip(ranks, suits) if rank == ranks[i]}
+    for suit in range(min(max(suits, default=-1) + 2, NUM_SUITS)):
+        if suit not in taken:
+            yield from _suit_assignments(ranks, suits + (suit,))
+
+
+def canonical_hands(ranks):
+    """
+    Every canonical six card hand with the given sorted ranks
+    """
+    hands = set()
+    for suits in _suit_assignments(ranks):
+        cards = [
+            CribbageCard.deserialize(suit * 13 + rank)
+            for rank, suit in zip(ranks, suits)
+        ]
+        (canonical_ids, _), _ = canonicalize(cards)
+        hands.add(canonical_ids)
+    return sorted(hands)
+
+
+def _evaluate_shard(shard):
+    """
+    Keys and values for every canonical hand whose ranks are in the shard
+    """
+    keys = []
+    values = []
+
+    for ranks in shard:
+        for canonical_ids in canonical_hands(ranks):
+            keys.append(encode_key(canonical_ids))
+
+            discard_values = _discard_values(canonical_ids)
+            values.append([
+                [avg_hand - avg_crib for avg_hand, avg_crib in discard_values],
+                [avg_hand + avg_crib for avg_hand, avg_crib in discard_values],
+            ])
+
+    return np.array(keys, dtype='<u8'), np.array(values, dtype='<f4')
+
+
+def gen_table(path=DISCARD_TABLE, processes=None, shard_size=64):
+    """
+    Evaluates every canonical deal across a process pool, sharded by the
+    ranks of the hand, and writes the table to path
+    """
+    all_ranks = list(rank_multisets(6))
+    shards = [
+        all_ranks[i:i + shard_size]
+        for i in range(0, len(all_ranks), shard_size)
+    ]
+
+    all_keys = []
+    all_values = []
+
+    with multiprocessing.Pool(processes) as pool:
+        results = pool.imap_unordered(_evaluate_shard, shards)
+        for i, (keys, values) in enumerate(results, 1):
+            all_keys.append(keys)
+            all_values.append(values)
+            logger.info(f"Shard {i}/{len(shards)} done")
+
+    keys = np.concatenate(all_keys)
+    values = np.concatenate(all_values)
+
+    order = np.argsort(keys)
+    keys = keys[order]
+    values = values[order]
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as fp:
+        fp.write(HEADER.pack(MAGIC, VERSION, 0, len(keys)))
+        fp.write(keys.tobytes())
+        fp.write(values.tobytes())
+    os.replace(tmp_path, path)  # Never leave a half written table behind
+
+    return len(keys)
+
+
+class DiscardTable:
+    """
+    Read-only view of a table written by gen_table()
+    The file is memory-mapped, so opening it is instant and the pages are
+    shared between every process that has it open
+    """
+    def __init__(self, path=DISCARD_TABLE):
+        with open(path, 'rb') as fp:
+            magic, version, _, num_records = HEADER.unpack(fp.read(HEADER.size))
+
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} discard table")
+
+        self.path = path
+        self.keys = np.memmap(
+            path, dtype='<u8', mode='r',
+            offset=HEADER.size, shape=(num_records,),
+        )
+        self.values = np.memmap(
+            path, dtype='<f4', mode='r',
+            offset=HEADER.size + self.keys.nbytes, shape=(num_records, 2, len(DISCARDS)),
+        )
+
+    def __reduce__(self):  # Other processes map the file too, not a copy of it
+        return self.__class__, (self.path,)
+
+    def evaluate_discards(self, full_hand, is_dealer):
+        """
+        Same as discard.optimal_discard, but looked up instead of computed
+        """
+        assert len(full_hand) == 6
+
+        (canonical_ids, _), ids = canonicalize(full_hand)
+        key = encode_key(canonical_ids)
+
+        index = int(np.searchsorted(self.keys, key))
+        if index == len(self.keys) or self.keys[index] != key:
+            raise KeyError(f"{full_hand} is missing from the discard table")
+
+        return rank_discards(canonical_ids, ids, self.values[index, int(bool(is_dealer))])
+
+    def best_discard(self, full_hand, is_dealer):
+        return self.evaluate_discards(full_hand, is_dealer)[0][1]
+
+    def __len__(self):
+        return len(self.keys)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    num_records = gen_table()
+    logger.info(f"Wrote {num_records} hands to {DISCARD_TABLE}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""
+Features of six card hands for the throwing models, worked out for whole
+batches of hands at once with NumPy
+Raw card ids make the models learn Cribbage arithmetic from scratch, these
+hand it to them instead: rank counts, pip totals, 15s, pairs, runs, flush
+potential and what the best four cards kept would score.
+hand_features() only depend on the hand up to relabeling suits, so they are
+cached per canonical hand
+"""
+import numpy as np
+
+import scoring
+from card import CribbageCard
+from canonical import canonicalize, CanonicalMemo
+from discard import DISCARDS
+from scoring import NUM_RANKS, NUM_SUITS, RANK_VALUE_ARRAY, SUBSETS, rank_array_index
+
+# Indexes of the cards kept and thrown for each of DISCARDS
+KEPT_INDEXES = np.array([[i for i in range(6) if i not in thrown] for thrown in DISCARDS])
+THROWN_INDEXES = np.array(DISCARDS)
+
+_PAIRS = np.array([(first, second) for first in range(6) for second in range(first + 1, 6)])
+
+# hand_features() columns, the last six line up with the cards of the hand
+NUM_HAND_FEATURES = NUM_RANKS + 14
+POSITION_FEATURES = slice(NUM_HAND_FEATURES - 6, NUM_HAND_FEATURES)
+
+FEATURE_MEMO = CanonicalMemo(2 ** 18)
+
+
+def _histogram(groups, size):
+    return (groups[..., None] == np.arange(size)).sum(axis=-2)
+
+
+def kept_scores(cards_matrix):
+    """
+    What the four cards kept by each of DISCARDS score before the cut, as an
+    N x 15 array
+    """
+    cards_matrix = np.asarray(cards_matrix)
+    kept = cards_matrix[:, KEPT_INDEXES]
+
+    ranks = np.sort(kept % NUM_RANKS, axis=-1)
+    suits = kept // NUM_RANKS
+    flush = (suits == suits[..., :1]).all(axis=-1)
+
+    return scoring.RANK_ARRAY_4[rank_array_index(ranks)] + 4 * flush
+
+
+def _longest_run(rank_counts):
+    longest = np.zeros(len(rank_counts), dtype=np.int64)
+    current = np.zeros(len(rank_counts), dtype=np.int64)
+    for rank in range(NUM_RANKS):
+        current = np.where(rank_counts[:, rank] > 0, current + 1, 0)
+        longest = np.maximum(longest, current)
+    return longest
+
+
+def _hand_features(cards_matrix):
+    """
+    hand_features() without the cache
+    """
+    cards_matrix = np.asarray(cards_matrix)
+    ranks = cards_matrix % NUM_RANKS
+    suits = cards_matrix // NUM_RANKS
+    values = RANK_VALUE_ARRAY[ranks].astype(np.int64)
+
+    rank_counts = _histogram(ranks, NUM_RANKS)
+    first, second = ranks[:, _PAIRS[:, 0]], ranks[:, _PAIRS[:, 1]]
+    pair_values = values[:, _PAIRS[:, 0]] + values[:, _PAIRS[:, 1]]
+
+    scores = kept_scores(cards_matrix)
+    # For each card, the best the hand can score with it thrown
+    best_without = np.stack([
+        scores[:, [d for d, thrown in enumerate(DISCARDS) if i in thrown]].max(axis=1)
+        for i in range(6)
+    ], axis=1)
+
+    return np.column_stack([
+        rank_counts,
+        values.sum(axis=1),
+        (pair_values == 15).sum(axis=1),           # Pairs making 15
+        ((values @ SUBSETS) == 15).sum(axis=1),    # Every way of making 15
+        (first == second).sum(axis=1),             # Pairs
+        (rank_counts > 0).sum(axis=1),             # Distinct ranks
+        _longest_run(rank_counts),
+        _histogram(suits, NUM_SUITS).max(axis=1),  # Flush potential
+        scores.max(axis=1),                        # Best four cards kept
+        best_without,
+    ]).astype(np.float32)
+
+
+def hand_features(cards_matrix, memo=FEATURE_MEMO):
+    """
+    N x NUM_HAND_FEATURES array of features for N six card hands of
+    serialized cards. Hands already in memo are looked up, the rest are
+    worked out in one batch. Pass memo=None to skip the cache
+    """
+    cards_matrix = np.asarray(cards_matrix)
+    assert cards_matrix.ndim == 2 and cards_matrix.shape[1] == 6
+
+    if memo is None:
+        return _hand_features(cards_matrix)
+
+    keys = []
+    positions = []
+    for row in cards_matrix.tolist():
+        (canonical_ids, _), ids = canonicalize([CribbageCard.deserialize(num) for num in row])
+        keys.append(canonical_ids)
+        positions.append([canonical_ids.index(num) for num in ids])
+
+    missing = sorted({key for key in keys if key not in memo})
+    computed = {}
+    if missing:
+        computed = dict(zip(missing, _hand_features(np.array(missing))))
+
+    # Everything is read before anything is added, so a batch with more new
+    # hands than the memo holds can't evict the hands it found cached
+    features = np.array([
+        computed[key] if key in computed else
+        memo.get(key, lambda key=key: _hand_features(np.array([key]))[0])
+        for key in keys
+    ])
+    for key, row in computed.items():
+        memo.get(key, lambda row=row: row)
+
+    # Cached in canonical card order, put back into the order of the hand
+    features[:, POSITION_FEATURES] = np.take_along_axis(
+        features[:, POSITION_FEATURES], np.array(positions), axis=1,
+    )
+    return features
+
+
+def throw_features(is_dealer_array, cards_matrix, memo=FEATURE_MEMO):
+    """
+    What ThrowingClassifier is trained on: [is_dealer, *cards, *hand_features]
+    """
+    cards_matrix = np.asarray(cards_matrix)
+    return np.column_stack((
+        np.asarray(is_dealer_array, dtype=np.float32),
+        cards_matrix,
+        hand_features(cards_matrix, memo),
+    ))
+
+
+def discard_features(is_dealer_array, cards_matrix):
+    """
+    Features of every one of the 15 discards from N hands, as an
+    N x 15 x num_features array. They only depend on which cards are kept and
+    which are thrown, not on the order they were dealt in:
+        is_dealer
+        rank histograms of the kept and the thrown cards
+        pip totals of the kept and the thrown cards
+        most kept cards of one suit, and whether the thrown cards are suited
+        what the kept cards score before the cut
+    """
+    cards_matrix = np.asarray(cards_matrix)
+    is_dealer_array = np.asarray(is_dealer_array)
+    num_hands = len(cards_matrix)
+
+    ranks = cards_matrix % NUM_RANKS
+    suits = cards_matrix // NUM_RANKS
+    values = RANK_VALUE_ARRAY[ranks].astype(np.int64)
+
+    kept_ranks, thrown_ranks = ranks[:, KEPT_INDEXES], ranks[:, THROWN_INDEXES]
+    thrown_suits = suits[:, THROWN_INDEXES]
+
+    return np.concatenate([
+        np.broadcast_to(is_dealer_array[:, None, None], (num_hands, len(DISCARDS), 1)),
+        _histogram(kept_ranks, NUM_RANKS),
+        _histogram(thrown_ranks, NUM_RANKS),
+        values[:, KEPT_INDEXES].sum(axis=-1, keepdims=True),
+        values[:, THROWN_INDEXES].sum(axis=-1, keepdims=True),
+        _histogram(suits[:, KEPT_INDEXES], NUM_SUITS).max(axis=-1, keepdims=True),
+        (thrown_suits[..., :1] == thrown_suits[..., 1:]),
+        kept_scores(cards_matrix)[..., None],
+    ], axis=-1).astype(np.float32)
@@ -5,12 +5,15 @@ could be hooked into any Cribbage game. Because of this, this cribbage game
 will not be very fun
 """
 
+import logging
 import random
 import itertools
 import copy
 
 from card import CribbageDeck, CribbageHand, CribbagePeggingPile
-from throwing_ai import ThrowingClassifier, RandomThrowingClassifier
+from throwing_ai import default_throwing_classifier
+
+logger = logging.getLogger(__name__)
 
 HAND_SIZE = 4
 
@@ -24,33 +27,35 @@ class CribbagePlayer:
         self._pegging_hand = None
         self._points = 0
 
+        self.thrown = []  # The cards this player put in the crib this hand
+
     def throw_away_cards(self):
         num_to_throw = len(self._hand) - HAND_SIZE
 
         while True:
-            print("***YOUR CARDS***")
-            print(f"{self.hand!s}")
+            logger.info("***YOUR CARDS***")
+            logger.info(f"{self.hand!s}")
             indexes = input(
                 f"Enter the indexes ({num_to_throw}) you want to throw away: "
             ).split()
 
             # Check that there are the right number of indexes
             if len(indexes) != num_to_throw:
-                print("Not the right number to throw away")
+                logger.warning("Not the right number to throw away")
                 continue
 
             # Check that indexes are actually integers
             try:
                 indexes = [int(index) for index in indexes]
             except ValueError as e:
-                print(f"{e.args} cannot be converted to int")
+                logger.warning(f"{e.args} cannot be converted to int")
                 continue
 
             # Check that indexes aren't out of bounds
             try:
                 cards = [self.hand[index] for index in indexes]
             except IndexError as e:
-                print(f"{e.args} is not a valid index")
+                logger.warning(f"{e.args} is not a valid index")
                 continue
 
             # Move cards to crib
@@ -58,41 +63,42 @@ class CribbagePlayer:
                 self.hand.pop(card)
                 self._game.crib.add(card)
                 self._pegging_hand = copy.deepcopy(self.hand)
+            self.thrown = cards
             break
 
     def put_down_pegging_card(self) -> bool:
         """
         Returns True if player has to say GO
         """
-        print(f"{self}'s turn")
+        logger.info(f"{self}'s turn")
 
         pegging_pile = self._game.pegging_pile
 
         # Check if Player has to say GO
         if len(self.pegging_hand) == 0 or \
                 pegging_pile.count() + self.minimum_card > pegging_pile.PEGGING_LIMIT:
-            print(f"{self} says GO")
+            logger.info(f"{self} says GO")
             return True
 
         while True:
-            print(f"Pegging pile count: {pegging_pile.count()}")
-            print(f"***PILE**")
-            print(f"{pegging_pile!s}")
-            print(f"***CARDS YOU HAVE LEFT***")
-            print(f"{self.pegging_hand!s}")
+            logger.info(f"Pegging pile count: {pegging_pile.count()}")
+            logger.info(f"***PILE**")
+            logger.info(f"{pegging_pile!s}")
+            logger.info(f"***CARDS YOU HAVE LEFT***")
+            logger.info(f"{self.pegging_hand!s}")
 
             try:
                 index = int(input(
                     f"Enter the index of the card you want to put down: "
                 ))
             except ValueError:
-                print("Invalid")
+                logger.warning("Invalid")
                 continue
 
             card = self.pegging_hand[index]
 
             if pegging_pile.count() + card.value > pegging_pile.PEGGING_LIMIT:
-                print(f"Pegging pile cannot exceed {pegging_pile.PEGGING_LIMIT}")
+                logger.warning(f"Pegging pile cannot exceed {pegging_pile.PEGGING_LIMIT}")
                 continue
             else:
                 self.pegging_hand.pop(card)
@@ -151,7 +157,7 @@ class CribbagePlayer:
 
 class RoboCribbagePlayer(CribbagePlayer):
     def __init__(self, *args, **kwargs):
-        self.throwing_classifier = ThrowingClassifier.load()
+        self.throwing_classifier = default_throwing_classifier()
 
         super().__init__(*args, **kwargs)
 
@@ -166,9 +172,9 @@ class RoboCribbagePlayer(CribbagePlayer):
 
         indexes = self.throwing_classifier.throw(is_dealer, serialized_cards)
 
-        # Check that indexes aren't out of bounds
+        # The classifiers give 0-based indexes, hand[] is 1-based
         try:
-            cards = [self.hand[index] for index in indexes]
+            cards = [hand.cards[index] for index in indexes]
         except IndexError as e:
             raise ValueError("The AI is broken")
 
@@ -176,10 +182,11 @@ class RoboCribbagePlayer(CribbagePlayer):
         for card in cards:
             hand.pop(card)
             game.crib.add(card)
+        self.thrown = cards
 
         self._pegging_hand = copy.deepcopy(self.hand)
 
-        print(f"***AI PLAYER {self.player_num} HAS THROWN AWAY***")
+        logger.info(f"***AI PLAYER {self.player_num} HAS THROWN AWAY***")
 
     def put_down_pegging_card(self):
         """
@@ -189,7 +196,7 @@ class RoboCribbagePlayer(CribbagePlayer):
 
         if len(self.pegging_hand) == 0 or \
                 pegging_pile.count() + self.minimum_card > pegging_pile.PEGGING_LIMIT:
-            print(f"{self} says GO")
+            logger.info(f"{self} says GO")
             return True
 
         while True:
@@ -247,9 +254,13 @@ class CribbageGame:
     def pegging_pile(self) -> CribbagePeggingPile:
         return self._pegging_pile
 
+    @property
+    def cut_card(self):
+        return self._cut_card
+
     def _print_scores(self):
         for player in self.players:
-            print(f"***{player!s} has {player.points} points***")
+            logger.info(f"***{player!s} has {player.points} points***")
 
     def _change_dealer(self):
         self._dealer = next(self._dealer_iter)
@@ -257,7 +268,7 @@ class CribbageGame:
 
     def win_handler(self, player):
         assert player.points > 120, ValueError("You little scumbag")
-        print(f"{player!s} has winned")
+        logger.info(f"{player!s} has winned")
         raise self.GameOver
 
     def _deal(self):
@@ -269,7 +280,7 @@ class CribbageGame:
         Automatically cuts, since there is no strategy worth exploring there
         """
         cut_card = self._deck.draw()
-        print(f"***CUT CARD IS {cut_card!s}***")
+        logger.info(f"***CUT CARD IS {cut_card!s}***")
         if cut_card.rank == 'Jack':
             self.dealer.points += 2
 
@@ -290,6 +301,7 @@ class CribbageGame:
         last_player = None
 
         pegging_pile = self._pegging_pile
+        pegging_pile.clear()
 
         round = 0
 
@@ -310,11 +322,14 @@ class CribbageGame:
                     while True:
                         go = player.put_down_pegging_card()
                         if go:
+                            pegging_pile.say_go(player)
                             pegging_pile.reset()  # Neither player can play
                             break
                         last_player = player
                 elif not player.hand.is_empty:
                     go = player.put_down_pegging_card()
+                    if go:
+                        pegging_pile.say_go(player)
                     last_player = player
                 else:
                     break
@@ -328,19 +343,19 @@ class CribbageGame:
         Automatically adds points in the hand to score
         """
         for player in self._players:
-            print(f"***{player!s} has these cards***")
-            print(f"{player.hand!s}")
-            print(f"Cut Card: {self._cut_card}")
+            logger.info(f"***{player!s} has these cards***")
+            logger.info(f"{player.hand!s}")
+            logger.info(f"Cut Card: {self._cut_card}")
             points = player.hand.count(self._cut_card)
-            print(f"***They were worth {points} points")
+            logger.info(f"***They were worth {points} points")
             player.points += points
 
     def _count_crib(self):
-        print(f"***{self.dealer!s} has the crib***")
-        print(f"{self._crib!s}")
-        print(f"Cut Card: {self._cut_card}")
-        points = self._crib.count(self._cut_card)
-        print(f"***They were worth {points} points")
+        logger.info(f"***{self.dealer!s} has the crib***")
+        logger.info(f"{self._crib!s}")
+        logger.info(f"Cut Card: {self._cut_card}")
+        points = self._crib.count(self._cut_card, is_crib=True)
+        logger.info(f"***They were worth {points} points")
         self.dealer.points += points
 
     def turn(self):
@@ -348,12 +363,12 @@ class CribbageGame:
         Does all logic necessary for a turn of Cribbage to take place
         """
         self._print_scores()
-        print(f"***{self.dealer!s} is the dealer***")
+        logger.info(f"***{self.dealer!s} is the dealer***")
 
-        print("***Shuffling Deck***")
+        logger.info("***Shuffling Deck***")
         self._deck.shuffle()
 
-        print("***Dealing Cards***")
+        logger.info("***Dealing Cards***")
         self._deal()
         self._make_players_throw_away()
 
@@ -378,6 +393,8 @@ class CribbageGame:
 
 
 def main():
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
     players = [
         CribbagePlayer(1),
         RoboCribbagePlayer(2),
@@ -0,0 +1,224 @@
+"""
+Counts and times calls to the hot paths, and reads the hit rates of the memos
+Off by default, and free while off: nothing is wrapped until enable() swaps
+the registered functions for timed ones, and disable() puts them back
+
+    import instrument
+    instrument.enable(profile=True)
+    ... play some games ...
+    instrument.disable()
+    instrument.dump('run.json', 'run.pstats')
+
+Times include everything a call does, so predict's time also contains the
+count calls it makes
+"""
+import cProfile
+import functools
+import importlib
+import json
+import time
+from contextlib import contextmanager
+
+# (name, owner, attribute) of every function that gets timed. Owners given as
+# strings are module names, imported on enable(). Several entries can share a
+# name, their calls are added together
+HOT_PATHS = [
+    ('count', 'card', 'CribbageHand.count'),
+    ('predict', 'card', 'CribbageHand.predict'),
+    ('optimal_discard', 'discard', 'optimal_discard'),
+    ('throw', 'throwing_ai', 'ThrowingClassifier.throw'),
+    ('throw_batch', 'throwing_ai', 'ThrowingClassifier.throw_batch'),
+    ('throw', 'throwing_ai', 'DiscardModel.throw'),
+    ('throw_batch', 'throwing_ai', 'DiscardModel.throw_batch'),
+    ('peg', 'game', 'CribbagePlayer.put_down_pegging_card'),
+    ('peg', 'game', 'RoboCribbagePlayer.put_down_pegging_card'),
+    ('peg', 'pegging_ai', 'RoboCribbagePeggerPlayer.put_down_pegging_card'),
+    ('peg', 'pegging_ai', 'RoboCribbageSolverPlayer.put_down_pegging_card'),
+    ('peg_monte_carlo', 'pegging_mc', 'MonteCarloPegger.choose'),
+    ('peg_solver', 'pegging_solver', 'PeggingSolver.best_card'),
+    ('sim_throw', 'sim', 'HeadlessGame._throw'),
+    ('sim_peg', 'sim', 'HeadlessGame._peg_card'),
+]
+
+# (name, owner, attribute) of every memo whose hit rate gets reported, either
+# a CanonicalMemo or an lru_cache'd function
+MEMOS = [
+    ('predict', 'card', 'PREDICT_MEMO'),
+    ('discard', 'discard', 'DISCARD_MEMO'),
+    ('expected_rank_points', 'scoring', 'expected_rank_points'),
+    ('features', 'features', 'FEATURE_MEMO'),
+]
+
+_stats = {}    # name -> [calls, seconds]
+_patched = []  # (owner, attribute name, original) to put back on disable()
+_profiler = None
+_started = None
+_elapsed = 0.0
+
+
+def register(name, owner, attribute):
+    """
+    Times owner.attribute under name from the next enable() on
+    """
+    HOT_PATHS.append((name, owner, attribute))
+
+
+def register_memo(name, owner, attribute):
+    MEMOS.append((name, owner, attribute))
+
+
+def _resolve(owner, attribute):
+    """
+    Returns (object holding the attribute, attribute name)
+    """
+    if isinstance(owner, str):
+        owner = importlib.import_module(owner)
+    *path, attribute = attribute.split('.')
+    for part in path:
+        owner = getattr(owner, part)
+    return owner, attribute
+
+
+def _timed(func, stat):
+    perf_counter = time.perf_counter
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stat[0] += 1
+            stat[1] += perf_counter() - start
+
+    return wrapper
+
+
+def enabled():
+    return _started is not None
+
+
+def enable(profile=False):
+    """
+    Starts counting from zero. With profile, everything else is run under
+    cProfile as well, which costs a lot more
+    """
+    global _profiler, _started, _elapsed
+
+    if enabled():
+        disable()
+    _stats.clear()
+    _elapsed = 0.0
+
+    for name, owner, attribute in HOT_PATHS:
+        owner, attribute = _resolve(owner, attribute)
+        # Only what owner defines itself, so subclasses don't wrap twice
+        original = vars(owner)[attribute]
+        stat = _stats.setdefault(name, [0, 0.0])
+        setattr(owner, attribute, _timed(original, stat))
+        _patched.append((owner, attribute, original))
+
+    _profiler = cProfile.Profile() if profile else None
+    _started = time.perf_counter()
+    if _profiler is not None:
+        _profiler.enable()
+
+
+def disable():
+    """
+    Puts the original functions back, the counts so far are kept for
+    summary() and dump()
+    """
+    global _started, _elapsed
+
+    if not enabled():
+        return
+
+    if _profiler is not None:
+        _profiler.disable()
+    _elapsed = time.perf_counter() - _started
+    _started = None
+
+    while _patched:
+        owner, attribute, original = _patched.pop()
+        setattr(owner, attribute, original)
+
+
+def _memo_stats(memo):
+    if hasattr(memo, 'cache_info'):
+        info = memo.cache_info()
+        hits, misses, size = info.hits, info.misses, info.currsize
+    else:
+        hits, misses, size = memo.hits, memo.misses, len(memo)
+
+    lookups = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / lookups if lookups else 0.0,
+        'size': size,
+    }
+
+
+def summary():
+    """
+    The counts since enable() as a dict that can be written out as JSON
+    Memo counts are since each memo was made or last cleared
+    """
+    elapsed = time.perf_counter() - _started if enabled() else _elapsed
+
+    calls = {}
+    for name, (num_calls, seconds) in _stats.items():
+        calls[name] = {
+            'calls': num_calls,
+            'seconds': seconds,
+            'us_per_call': seconds / num_calls * 1e6 if num_calls else 0.0,
+        }
+
+    memos = {}
+    for name, owner, attribute in MEMOS:
+        owner, attribute = _resolve(owner, attribute)
+        memos[name] = _memo_stats(getattr(owner, attribute))
+
+    return {'seconds': elapsed, 'calls': calls, 'memos': memos}
+
+
+def dump(path, profile_path=None):
+    """
+    Writes summary() to path, and the cProfile stats to profile_path if
+    enable() was asked to profile. Read those with pstats or snakeviz
+    """
+    with open(path, 'w') as fp:
+        json.dump(summary(), fp, indent=2, sort_keys=True)
+
+    if profile_path is not None and _profiler is not None:
+        _profiler.dump_stats(profile_path)
+
+
+@contextmanager
+def instrumented(path=None, profile_path=None):
+    """
+    Instruments everything run inside the with block, writing the results out
+    at the end if path is given
+    """
+    enable(profile=profile_path is not None)
+    try:
+        yield
+    finally:
+        disable()
+        if path is not None:
+            dump(path, profile_path)
+
+
+def main():
+    from sim import play_games, best_throw, greedy_peg
+
+    with instrumented('instrument.json', 'instrument.pstats'):
+        for _ in play_games(10, [best_throw] * 2, [greedy_peg] * 2):
+            pass
+
+    print(json.dumps(summary(), indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
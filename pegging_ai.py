@@ -1,21 +1,56 @@
 """
 https://adventuresinmachinelearning.com/reinforcement-learning-tensorflow/
 """
+import logging
 import random
+from card import CribbageCard
 from game import CribbageGame, RoboCribbagePlayer
+from pegging_solver import PeggingSolver
+from pegging_mc import MonteCarloPegger
 
 try:
     from rl_ai import AIPeg
 except ImportError:
     # raise EnvironmentError("Reid hasn't written this yet")
-    def AIPeg(cards, pegging_count, top_card):
-        print(f"cards {cards}")
-        print(f"pegging count {pegging_count}")
-        print(f"top card {top_card}")
-        return random.randint(0, len(cards) - 1)
+    AIPeg = None  # Sample the other player's cards instead, see pegging_mc.py
+
+logger = logging.getLogger(__name__)
 
 
 class RoboCribbagePeggerPlayer(RoboCribbagePlayer):
+    monte_carlo_pegger = MonteCarloPegger()
+
+    def _opponent(self):
+        return next(player for player in self._game.players if player is not self)
+
+    def _last_was_me(self):
+        pegging_pile = self._game.pegging_pile
+        return len(pegging_pile) > 0 and pegging_pile[-1] in self.hand
+
+    def _monte_carlo_card(self):
+        """
+        Only uses what this player could actually know: its own cards, the
+        cut and whatever has been pegged
+        """
+        game = self._game
+        pegging_pile = game.pegging_pile
+        opponent = self._opponent()
+
+        seen = set(self.hand) | set(self.thrown) | set(pegging_pile.history)
+        seen.add(game.cut_card)
+        unseen_cards = [card for card in CribbageCard.all() if card not in seen]
+
+        go_counts = [count for player, count in pegging_pile.gos if player is opponent]
+
+        return self.monte_carlo_pegger.choose(
+            list(self.pegging_hand),
+            list(pegging_pile),
+            unseen_cards,
+            len(opponent.pegging_hand),
+            self._last_was_me(),
+            min(go_counts, default=None),  # Every card left was too big even then
+        )
+
     def put_down_pegging_card(self):
         """
         Uses reinforcement learning to choose pegging card
@@ -25,9 +60,15 @@ class RoboCribbagePeggerPlayer(RoboCribbagePlayer):
 
         if len(self.pegging_hand) == 0 or \
                 pegging_pile.count() + self.minimum_card > pegging_pile.PEGGING_LIMIT:
-            print(f"{self} says GO")
+            logger.info(f"{self} says GO")
             return True
 
+        if AIPeg is None:
+            card = self._monte_carlo_card()
+            self.pegging_hand.pop(card)
+            self.points += pegging_pile.add(card)
+            return False
+
         try:
             top_card = pegging_pile.cards[-1].serialize() % 13
         except IndexError:
@@ -51,6 +92,35 @@ class RoboCribbagePeggerPlayer(RoboCribbagePlayer):
         return False
 
 
+class RoboCribbageSolverPlayer(RoboCribbagePeggerPlayer):
+    """
+    Pegs perfectly by peeking at the other player's cards and solving the rest
+    of the pegging exactly
+    """
+    solver = PeggingSolver()  # Shared, so the transposition table is too
+
+    def put_down_pegging_card(self):
+        game = self._game
+        pegging_pile = game.pegging_pile
+
+        if len(self.pegging_hand) == 0 or \
+                pegging_pile.count() + self.minimum_card > pegging_pile.PEGGING_LIMIT:
+            logger.info(f"{self} says GO")
+            return True
+
+        card = self.solver.best_card(
+            list(self.pegging_hand),
+            list(self._opponent().pegging_hand),
+            list(pegging_pile),
+            self._last_was_me(),
+        )
+
+        self.pegging_hand.pop(card)
+        self.points += pegging_pile.add(card)
+
+        return False
+
+
 class PeggingTestGame(CribbageGame):
     def turn(self):
         """
@@ -73,6 +143,8 @@ class PeggingTestGame(CribbageGame):
 
 
 def main():
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
     PeggingTestGame([
         RoboCribbagePeggerPlayer(1),
         RoboCribbagePlayer(2),
@@ -0,0 +1,136 @@
+"""
+Pegging when the other player's cards are hidden
+Their remaining cards are sampled from the cards we haven't seen that they
+could still hold, each sample is solved exactly as if it were the truth, and
+the card with the best average over the samples is played. The time budget is
+a hard limit: a solve still running when it runs out is abandoned, and if no
+sample finished the card scoring the most right now is played
+"""
+import random
+import time
+
+from pegging_solver import PeggingSolver, SolverTimeout, num_same_rank
+from scoring import PEGGING_LIMIT, pegging_points
+
+_WORKER_SOLVER = None
+
+
+def _evaluate_samples(args):
+    """
+    Sums the value of each playable rank over the sampled opponent hands,
+    stopping early at the deadline. Returns (totals, number of samples used)
+    """
+    global _WORKER_SOLVER
+    solver, my_cards, samples, pile_cards, last_was_me, deadline = args
+
+    if solver is None:  # In a worker, keep one solver around between moves
+        if _WORKER_SOLVER is None:
+            _WORKER_SOLVER = PeggingSolver()
+        solver = _WORKER_SOLVER
+
+    totals = {}
+    num_samples = 0
+    for opponent_cards in samples:
+        if time.perf_counter() > deadline:
+            break
+        try:
+            values = solver.card_values(
+                my_cards, opponent_cards, pile_cards, last_was_me, deadline,
+            )
+        except SolverTimeout:
+            break
+        for rank, value in values.items():
+            totals[rank] = totals.get(rank, 0) + value
+        num_samples += 1
+
+    return totals, num_samples
+
+
+class MonteCarloPegger:
+    def __init__(self, time_budget=0.05, max_samples=500, pool=None, rng=random,
+                 pool_size=None):
+        """
+        time_budget is the most wall clock time in seconds a move can take.
+        With a multiprocessing pool the samples are split into one chunk for
+        each of its pool_size workers, the processes it was made with
+        """
+        if pool is not None and not pool_size:
+            raise ValueError("A pool needs its pool_size")
+
+        self.time_budget = time_budget
+        self.max_samples = max_samples
+        self.pool = pool
+        self.pool_size = pool_size
+        self.rng = rng
+
+        self.solver = PeggingSolver()
+
+    def choose(self, my_cards, pile_cards, unseen_cards, num_opponent_cards,
+               last_was_me=False, opponent_go_count=None):
+        """
+        The card from my_cards to play, or None if none of them can be played
+
+        unseen_cards are the cards the opponent could be holding: everything
+        but our own cards, the cut and the cards already pegged.
+        opponent_go_count is the lowest count the opponent said go at this
+        hand, if they did. They had nothing that fit then, and still don't
+        """
+        deadline = time.perf_counter() + self.time_budget
+
+        my_cards = list(my_cards)
+        pile_cards = list(pile_cards)
+        unseen_cards = list(unseen_cards)
+
+        # Same as rejecting every sample holding a card they could have played
+        if opponent_go_count is not None:
+            too_big = [
+                card for card in unseen_cards
+                if opponent_go_count + card.value > PEGGING_LIMIT
+            ]
+            if len(too_big) >= num_opponent_cards:
+                unseen_cards = too_big
+        num_opponent_cards = min(num_opponent_cards, len(unseen_cards))
+
+        samples = [
+            self.rng.sample(unseen_cards, num_opponent_cards)
+            for _ in range(self.max_samples)
+        ]
+
+        if self.pool is None:
+            results = [_evaluate_samples(
+                (self.solver, my_cards, samples, pile_cards, last_was_me, deadline)
+            )]
+        else:
+            num_workers = self.pool_size
+            results = self.pool.map(_evaluate_samples, [
+                (None, my_cards, samples[i::num_workers], pile_cards, last_was_me, deadline)
+                for i in range(num_workers)
+            ])
+
+        totals = {}
+        for worker_totals, _ in results:
+            for rank, total in worker_totals.items():
+                totals[rank] = totals.get(rank, 0) + total
+
+        if not totals:
+            return self._greedy_card(my_cards, pile_cards)
+
+        best_rank = max(sorted(totals), key=totals.__getitem__)
+        return next(card for card in my_cards if card.rank_index == best_rank)
+
+    @staticmethod
+    def _greedy_card(my_cards, pile_cards):
+        """
+        The playable card that scores the most right now, for when the time
+        ran out before any sample was solved. None if nothing can be played
+        """
+        ranks = [card.rank_index for card in pile_cards]
+        count = sum(card.value for card in pile_cards)
+        same_rank = num_same_rank(ranks)
+
+        playable = [card for card in my_cards if count + card.value <= PEGGING_LIMIT]
+        if not playable:
+            return None
+        return max(playable, key=lambda card: (
+            pegging_points(ranks, count, card.rank_index, same_rank), card.value,
+        ))
@@ -0,0 +1,159 @@
+"""
+Solves two player pegging exactly when both hands are known
+Suits don't matter when pegging, so states are kept as ranks only, and
+positions reached through different orders of play share one entry in a
+bounded transposition table
+"""
+import time
+
+from canonical import CanonicalMemo
+from scoring import RANK_VALUES, PEGGING_LIMIT, pegging_points
+
+
+class SolverTimeout(Exception):
+    """
+    A solve ran past its deadline. Only finished positions are kept in the
+    transposition table, so the solver can be used again straight away
+    """
+
+
+def num_same_rank(pile):
+    """
+    How many ranks on top of pile are the same as the top one
+    """
+    num = 0
+    for rank in reversed(pile):
+        if rank != pile[-1]:
+            break
+        num += 1
+    return num
+
+
+def _can_play(hand, count):
+    return any(count + RANK_VALUES[rank] <= PEGGING_LIMIT for rank in hand)
+
+
+def _remove(hand, rank):
+    i = hand.index(rank)
+    return hand[:i] + hand[i + 1:]
+
+
+class PeggingSolver:
+    """
+    Values are the pegging points player 0 will score from here on minus the
+    points player 1 will, with both playing perfectly
+    """
+    def __init__(self, maxsize=2 ** 20):
+        self.table = CanonicalMemo(maxsize)
+        self.deadline = None  # time.perf_counter() to give up at, see card_values()
+
+    def _children(self, hands, pile, count, turn):
+        """
+        Yields (rank, points, child state) for every rank turn can play
+        """
+        hand = hands[turn]
+        same_rank = num_same_rank(pile)
+
+        for rank in sorted(set(hand)):
+            new_count = count + RANK_VALUES[rank]
+            if new_count > PEGGING_LIMIT:
+                continue
+
+            points = pegging_points(pile, count, rank, same_rank)
+
+            new_hands = list(hands)
+            new_hands[turn] = _remove(hand, rank)
+            if new_count == PEGGING_LIMIT:  # The pile starts over
+                child = (tuple(new_hands), (), 0, 1 - turn, turn)
+            else:
+                child = (tuple(new_hands), pile + (rank,), new_count, 1 - turn, turn)
+
+            yield rank, points, child
+
+    def _solve(self, hands, pile, count, turn, last_player):
+        key = (hands, pile, turn, last_player)
+        return self.table.get(
+            key, lambda: self._search(hands, pile, count, turn, last_player),
+        )
+
+    def _search(self, hands, pile, count, turn, last_player):
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise SolverTimeout
+
+        sign = 1 if turn == 0 else -1
+
+        if not hands[0] and not hands[1]:
+            # One for the last card, unless it made 31 and the pile started over
+            if not pile:
+                return 0
+            return 1 if last_player == 0 else -1
+
+        best = None
+        for _, points, child in self._children(hands, pile, count, turn):
+            value = sign * points + self._solve(*child)
+            if best is None or sign * value > sign * best:
+                best = value
+
+        if best is not None:
+            return best
+
+        other = 1 - turn
+        if _can_play(hands[other], count):  # Go, the other player keeps playing
+            return self._solve(hands, pile, count, other, last_player)
+
+        # Nobody can play, the last player gets one and the pile starts over
+        go = 1 if last_player == 0 else -1
+        return go + self._solve(hands, (), 0, 1 - last_player, last_player)
+
+    @staticmethod
+    def _state(my_cards, opponent_cards, pile_cards, last_was_me):
+        """
+        State from the point of view of the player about to play, who is
+        player 0
+        """
+        hands = (
+            tuple(sorted(card.rank_index for card in my_cards)),
+            tuple(sorted(card.rank_index for card in opponent_cards)),
+        )
+        pile = tuple(card.rank_index for card in pile_cards)
+        count = sum(card.value for card in pile_cards)
+        last_player = 0 if last_was_me else 1
+        return hands, pile, count, 0, last_player
+
+    def value(self, my_cards, opponent_cards, pile_cards=(), last_was_me=False):
+        """
+        Pegging points the player about to play will score from here on,
+        minus the points their opponent will
+        """
+        return self._solve(*self._state(my_cards, opponent_cards, pile_cards, last_was_me))
+
+    def card_values(self, my_cards, opponent_cards, pile_cards=(), last_was_me=False,
+                    deadline=None):
+        """
+        Maps each rank the player about to play could put down to the value of
+        playing it, in the same terms as value()
+        Raises SolverTimeout if it isn't done by deadline, a time.perf_counter()
+        """
+        hands, pile, count, turn, last_player = \
+            self._state(my_cards, opponent_cards, pile_cards, last_was_me)
+
+        self.deadline = deadline
+        try:
+            return {
+                rank: points + self._solve(*child)
+                for rank, points, child in self._children(hands, pile, count, turn)
+            }
+        finally:
+            self.deadline = None
+
+    def best_card(self, my_cards, opponent_cards, pile_cards=(), last_was_me=False):
+        """
+        The card from my_cards that is best to play, or None if nothing can be
+        played
+        """
+        values = self.card_values(my_cards, opponent_cards, pile_cards, last_was_me)
+        if not values:
+            return None
+
+        best_rank = max(sorted(values), key=values.__getitem__)
+        return next(card for card in my_cards if card.rank_index == best_rank)
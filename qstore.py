@@ -0,0 +1,211 @@
+"""
+Storage for Q tables
+DenseQStore is a plain array, for encodings whose states mostly get visited.
+SparseQStore only holds the states that have actually been visited, which
+only saves memory when those are a small fraction of them.
+Both save to a single .npy file, so checkpoints can be written atomically and
+finished tables can be memory-mapped read-only with load_readonly()
+"""
+import json
+import os
+from itertools import repeat
+
+import numpy as np
+
+from util import save_npy_atomic
+
+
+class DenseQStore:
+    def __init__(self, num_states, num_actions, dtype=np.float32):
+        self.values = np.zeros((num_states, num_actions), dtype=dtype)
+
+    def rows(self, states):
+        return self.values[states]
+
+    def update(self, states, actions, values):
+        self.values[states, actions] = values
+
+    def __getitem__(self, state):
+        return self.values[state]
+
+    def __setitem__(self, state, row):
+        self.values[state] = row
+
+    def save(self, path):
+        save_npy_atomic(path, self.values)
+
+    @classmethod
+    def load(cls, path):
+        store = cls.__new__(cls)
+        store.values = np.load(path)
+        return store
+
+
+class SparseQStore:
+    """
+    Only holds the states that have actually been visited, unvisited states
+    read as all zeros. The action values live in one array that grows as
+    states are added, with a dict from state to its row, so each state costs
+    a dict entry and its row instead of an array object of its own
+    """
+    def __init__(self, num_actions, dtype=np.float32, capacity=1024):
+        self.num_actions = num_actions
+        self.dtype = np.dtype(dtype)
+        self._index = {}  # State -> row of self._values
+        self._values = np.zeros((capacity, num_actions), dtype=self.dtype)
+        self._zeros = np.zeros(num_actions, dtype=self.dtype)
+
+    def _lookup(self, states):
+        """
+        The row of each state, -1 for states that haven't been visited
+        """
+        states = np.asarray(states, dtype=np.int64)
+        return np.fromiter(
+            map(self._index.get, states.tolist(), repeat(-1)),
+            dtype=np.int64,
+            count=len(states),
+        )
+
+    def _add(self, states):
+        """
+        The row of each state, adding rows for the ones not seen yet
+        """
+        states = np.asarray(states, dtype=np.int64)
+        index = self._lookup(states)
+        new = index < 0
+        if new.any():
+            new_states = np.unique(states[new]).tolist()
+            start = len(self._index)
+            self._reserve(start + len(new_states))
+            self._index.update(zip(new_states, range(start, start + len(new_states))))
+            index[new] = self._lookup(states[new])
+        return index
+
+    def _reserve(self, num_states):
+        capacity = len(self._values)
+        if num_states <= capacity:
+            return
+        values = np.zeros((max(num_states, 2 * capacity), self.num_actions), dtype=self.dtype)
+        values[:capacity] = self._values
+        self._values = values
+
+    def rows(self, states):
+        index = self._lookup(states)
+        rows = self._values[index]
+        rows[index < 0] = 0
+        return rows
+
+    def update(self, states, actions, values):
+        index = self._add(states)  # Before reading self._values, which it can replace
+        self._values[index, actions] = values
+
+    def __getitem__(self, state):
+        row = self._index.get(int(state))
+        if row is None:
+            return self._zeros
+        return self._values[row]
+
+    def __setitem__(self, state, row):
+        index = self._add([state])[0]
+        self._values[index] = row
+
+    def __len__(self):
+        return len(self._index)
+
+    def _records(self):
+        dtype = np.dtype([('state', '<i8'), ('values', self.dtype, (self.num_actions,))])
+        records = np.zeros(len(self._index), dtype=dtype)
+        if self._index:
+            states = np.array(sorted(self._index), dtype=np.int64)
+            records['state'] = states
+            records['values'] = self._values[self._lookup(states)]
+        return records
+
+    def save(self, path):
+        """
+        Saved sorted by state, so load_readonly() can binary search it
+        """
+        save_npy_atomic(path, self._records())
+
+    @classmethod
+    def load(cls, path):
+        records = np.load(path)
+        store = cls(
+            records.dtype['values'].shape[0],
+            records.dtype['values'].base,
+            capacity=max(len(records), 1),
+        )
+        store._values[:len(records)] = records['values']
+        store._index = dict(zip(records['state'].tolist(), range(len(records))))
+        return store
+
+
+def load_store(path):
+    """
+    Loads whichever kind of store was saved to path, for resuming training
+    """
+    if np.load(path, mmap_mode='r').dtype.names:
+        return SparseQStore.load(path)
+    return DenseQStore.load(path)
+
+
+class ReadOnlyQ:
+    """
+    A saved store memory-mapped read-only, for agents that only need to look
+    states up. Only the pages that are actually read get loaded
+    """
+    def __init__(self, path):
+        array = np.load(path, mmap_mode='r')
+        if array.dtype.names:
+            self._states = array['state']
+            self._values = array['values']
+        else:
+            self._states = None
+            self._values = array
+        self._zeros = np.zeros(self._values.shape[1], dtype=self._values.dtype)
+
+    def __getitem__(self, state):
+        if self._states is None:
+            return self._values[state]
+
+        index = int(np.searchsorted(self._states, state))
+        if index < len(self._states) and self._states[index] == state:
+            return self._values[index]
+        return self._zeros
+
+    def best_action(self, state, valid=None):
+        row = np.asarray(self[state], dtype=np.float64)
+        if valid is not None:
+            row = np.where(valid, row, -np.inf)
+        return int(np.argmax(row))
+
+
+def load_readonly(path):
+    return ReadOnlyQ(path)
+
+
+def save_checkpoint(store, path, step):
+    """
+    Saves store and how far training got, each replaced atomically so a
+    crash never leaves a torn checkpoint behind
+    """
+    store.save(path)
+
+    meta_path = f"{path}.json"
+    tmp_path = f"{meta_path}.tmp"
+    with open(tmp_path, 'w') as fp:
+        json.dump({'step': step}, fp)
+    os.replace(tmp_path, meta_path)
+
+
+def load_checkpoint(path):
+    """
+    Returns (store, step) from save_checkpoint, or (None, 0) if there isn't one
+    """
+    meta_path = f"{path}.json"
+    if not (os.path.exists(path) and os.path.exists(meta_path)):
+        return None, 0
+
+    with open(meta_path) as fp:
+        step = json.load(fp)['step']
+    return load_store(path), step
@@ -1,7 +1,27 @@
 import numpy as np
 
+import logging
+
 import random
 
+from collections import Counter
+
+from itertools import combinations_with_replacement, islice
+
+from qstore import DenseQStore, save_checkpoint, load_checkpoint
+
+logger = logging.getLogger(__name__)
+
+Q_FILE = 'q.npy'
+CHECKPOINT_FILE = 'q_checkpoint.npy'
+
+# (4 hand ranks, top rank, count, cards left bitmask), as used by pegEnv
+LEGACY_STATE_DIMS = (13, 13, 13, 13, 13, 31, 16)
+
+
+def encode_legacy_state(state):
+	return int(np.ravel_multi_index(state, LEGACY_STATE_DIMS))
+
 
 
 class pegEnv():
@@ -118,21 +138,188 @@ class pegEnv():
 
 
 
+# Suit-free compact encoding for the batched environment:
+# the ranks left in hand as a sorted multiset (NO_CARD marks a played card),
+# the rank on top of the pile (NO_CARD when empty) and the count, 0 to 31.
+NO_CARD = 13
+HAND_SIZE = 4
+MAX_COUNT = 31
+VALUES = np.array([1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 10, 10, 10, 0])
+
+
+def _build_hand_index():
+	"""
+	Maps every sorted hand, read as a base 14 number, to a dense index
+	"""
+	hand_index = np.full(14 ** HAND_SIZE, -1, dtype=np.int32)
+	num = 0
+	for size in range(HAND_SIZE + 1):
+		for ranks in combinations_with_replacement(range(13), size):
+			if max(Counter(ranks).values(), default=0) > 4:
+				continue
+			padded = ranks + (NO_CARD,) * (HAND_SIZE - size)
+			key = 0
+			for rank in padded:
+				key = key * 14 + rank
+			hand_index[key] = num
+			num += 1
+	return hand_index, num
+
+
+HAND_INDEX, NUM_HANDS = _build_hand_index()
+NUM_STATES = NUM_HANDS * 14 * (MAX_COUNT + 1)  # About a million, so Q is ~17MB
+
+
+def encode_states(hands, top, count):
+	"""
+	Dense state indexes for a batch of sorted hands, top ranks and counts
+	"""
+	key = np.zeros(len(hands), dtype=np.int64)
+	for i in range(HAND_SIZE):
+		key = key * 14 + hands[:, i]
+	return (HAND_INDEX[key].astype(np.int64) * 14 + top) * (MAX_COUNT + 1) + np.minimum(count, MAX_COUNT)
+
+
+class BatchPegEnv():
+	"""
+	Steps many single player pegging episodes at once as arrays
+	Playing scores 2 for pairing the top card, 2 for 15 and 2 for 31. When
+	no card fits under 31 the pile starts over, and an episode is done once
+	every card has been played
+	"""
+
+	def __init__(self, batch_size=4096, seed=None):
+		self.batch_size = batch_size
+		self.rng = np.random.default_rng(seed)
+
+		self.hands = np.full((batch_size, HAND_SIZE), NO_CARD, dtype=np.int64)
+		self.top = np.full(batch_size, NO_CARD, dtype=np.int64)
+		self.count = np.zeros(batch_size, dtype=np.int64)
+
+	def reset(self, which=None):
+		"""
+		Deals new episodes into the lanes where which is True (all by default)
+		"""
+		if which is None:
+			which = np.ones(self.batch_size, dtype=bool)
+		num = int(which.sum())
+
+		# Four cards from a real deck, so no rank shows up more than 4 times
+		deals = np.argsort(self.rng.random((num, 52)), axis=1)[:, :HAND_SIZE]
+		self.hands[which] = np.sort(deals % 13, axis=1)
+		self.top[which] = self.rng.integers(0, NO_CARD + 1, num)
+		self.count[which] = self.rng.integers(0, MAX_COUNT, num)
+
+		self._restart_stuck_piles()
+		return self.state()
+
+	def state(self):
+		return encode_states(self.hands, self.top, self.count)
+
+	def valid_actions(self):
+		return (self.hands != NO_CARD) & (self.count[:, None] + VALUES[self.hands] <= MAX_COUNT)
+
+	def _restart_stuck_piles(self):
+		stuck = (self.count == MAX_COUNT) | ~self.valid_actions().any(axis=1)
+		self.count[stuck] = 0
+		self.top[stuck] = NO_CARD
+
+	def step(self, actions):
+		lanes = np.arange(self.batch_size)
+		ranks = self.hands[lanes, actions]
+		count = self.count + VALUES[ranks]
+
+		reward = 2 * (ranks == self.top) + 2 * (count == 15) + 2 * (count == MAX_COUNT)
+
+		self.hands[lanes, actions] = NO_CARD
+		self.hands.sort(axis=1)
+		self.top = ranks
+		self.count = count
+		self._restart_stuck_piles()
+
+		done = (self.hands == NO_CARD).all(axis=1)
+		return self.state(), reward, done
+
+	def sample_actions(self, valid):
+		"""
+		A uniformly random valid action for each lane
+		"""
+		return np.argmax(np.where(valid, self.rng.random(valid.shape), -1), axis=1)
+
+
+def train_batched(env, num_steps=100000, alpha=0.5, epsilon=0.1,
+		store=None, checkpoint_path=None, checkpoint_every=10000):
+	"""
+	Epsilon greedy Q learning over every lane of env at once
+	With a checkpoint_path the store is saved every checkpoint_every steps,
+	and a run pointed at an existing checkpoint carries on from it
+	"""
+	start = 0
+	if checkpoint_path is not None:
+		saved, start = load_checkpoint(checkpoint_path)
+		store = saved if saved is not None else store  # An empty SparseQStore is falsy
+	if store is None:
+		store = DenseQStore(NUM_STATES, HAND_SIZE)
+
+	state = env.reset()
+	for step in range(start, num_steps):
+		valid = env.valid_actions()
+
+		greedy = np.argmax(np.where(valid, store.rows(state), -np.inf), axis=1)
+		explore = env.rng.random(env.batch_size) < epsilon
+		actions = np.where(explore, env.sample_actions(valid), greedy)
+
+		next_state, reward, done = env.step(actions)
+
+		next_valid = env.valid_actions()
+		next_max = np.where(next_valid, store.rows(next_state), -np.inf).max(axis=1)
+		next_max[done | ~next_valid.any(axis=1)] = 0
+
+		old_value = store.rows(state)[np.arange(len(state)), actions]
+		store.update(state, actions, (1 - alpha) * old_value + alpha * (reward + next_max))
+
+		if done.any():
+			env.reset(done)
+		state = env.state()
+
+		if step % checkpoint_every == 0:
+			logger.info(f"Step {step}")
+			if checkpoint_path is not None:
+				save_checkpoint(store, checkpoint_path, step + 1)
+
+	logger.info("Training finished.")
+	return store
+
+
 def main():
 
+	logging.basicConfig(level=logging.INFO, format='%(message)s')
+
 	random.seed()
 
-	env = pegEnv()
+	env = BatchPegEnv()
 
-	Q = train_agent(env)
+	Q = train_batched(env, checkpoint_path=CHECKPOINT_FILE)
 
-	np.save("q.csv", Q)
+	Q.save(Q_FILE)  # Load with qstore.load_readonly to look states up
 
 
 
-def train_agent(env):
+def train_agent(env, checkpoint_path=None, checkpoint_every=1000000):
 
-	Q = np.zeros((13,13,13,13,13,31, 16, 4))
+	"""
+
+	This visits nearly every one of the ~184M legacy states, so the table is
+
+	dense float32, ~2.9GB. A sparse store would need far more than that
+
+	"""
+
+	Q, start = (None, 0) if checkpoint_path is None else load_checkpoint(checkpoint_path)
+
+	if Q is None:
+
+		Q = DenseQStore(int(np.prod(LEGACY_STATE_DIMS)), 4)
 
 	alpha = 0.5
 
@@ -140,20 +327,24 @@ def train_agent(env):
 
 
 
-	lick = 0
+	lick = start
 
 	lol = 0
 
-	for index, x in np.ndenumerate(Q):
+	for index in islice(np.ndindex(*LEGACY_STATE_DIMS, 4), start, None):
 
 		lick += 1
 
 		if (lick % 100000 == 0):
 
-			print(lol)
+			logger.info(lol)
 
 			lol += 1
 
+		if checkpoint_path is not None and lick % checkpoint_every == 0:
+
+			save_checkpoint(Q, checkpoint_path, lick)
+
 		temp1 = list(index)
 
 		temp1.pop(7)
@@ -190,7 +381,7 @@ def train_agent(env):
 
 				else:
 
-					action = np.argmax(Q[state])
+					action = np.argmax(Q[encode_legacy_state(state)])
 
 
 
@@ -214,25 +405,21 @@ def train_agent(env):
 
 
 
-				temp = list(state)
-
-				temp.append(action)
-
-				temp = tuple(temp)
+				row = Q[encode_legacy_state(state)].copy()
 
-
-
-				old_value = Q[temp]
+				old_value = row[action]
 
 				#print('nextState: ', next_state)
 
-				next_max = np.max(Q[next_state])
+				next_max = np.max(Q[encode_legacy_state(next_state)])
 
 
 
 				new_value = (1 - alpha) * old_value + alpha * (reward + next_max)
 
-				Q[temp] = new_value
+				row[action] = new_value
+
+				Q[encode_legacy_state(state)] = row
 
 
 
@@ -240,7 +427,7 @@ def train_agent(env):
 
 
 
-	print("Training finished.\n")
+	logger.info("Training finished.")
 
 	return Q
 
@@ -0,0 +1,350 @@
+"""
+Table driven scoring for Cribbage hands
+15s, pairs and runs only depend on the ranks of the cards, so they are looked
+up in a table keyed by the sorted ranks of the hand. Only the flush and nobs
+need the suits, and those are cheap to add on afterwards.
+The tables are only built the first time RANK_TABLE or RANK_ARRAY is used,
+so importing this (in every pool worker too) stays cheap.
+score_hands() scores whole arrays of hands at once with NumPy
+"""
+from collections import Counter
+from functools import lru_cache
+from itertools import combinations, combinations_with_replacement
+from math import comb
+
+import numpy as np
+
+from util import powerset_min_len
+
+NUM_RANKS = 13
+NUM_SUITS = 4
+JACK = 10  # Rank index of a Jack
+
+RANK_VALUES = tuple(min(rank + 1, 10) for rank in range(NUM_RANKS))
+
+PAIR_POINTS = {1: 0, 2: 2, 3: 6, 4: 12}
+
+PEGGING_LIMIT = 31
+
+# Every subset of up to six cards, one column each, for 15s. The first
+# 2 ** n columns only use the first n cards
+SUBSETS = np.array(
+    [[(subset >> i) & 1 for subset in range(64)] for i in range(6)],
+    dtype=np.int8,
+)
+RANK_VALUE_ARRAY = np.array(RANK_VALUES, dtype=np.int8)
+
+
+def rank_points(ranks):
+    """
+    Scores 15s, pairs and runs for a collection of rank indexes the slow way
+    Kept to check the tables against, see test_scoring.py
+    """
+    total = 0
+
+    # 15s
+    for combo in powerset_min_len(ranks):
+        if sum(RANK_VALUES[rank] for rank in combo) == 15:
+            total += 2
+
+    rank_counter = Counter(ranks)
+
+    # Pairs
+    for num in rank_counter.values():
+        total += PAIR_POINTS[num]
+
+    # Runs
+    num_in_a_row = 0
+    multiplier = 1
+    for rank in range(NUM_RANKS + 1):  # One past the King ends the last run
+        if rank in rank_counter:
+            num_in_a_row += 1
+            multiplier *= rank_counter[rank]
+        else:
+            if num_in_a_row >= 3:
+                total += num_in_a_row * multiplier
+            num_in_a_row = 0
+            multiplier = 1
+
+    return total
+
+
+def rank_multisets(size):
+    """
+    Every sorted tuple of ranks that can be dealt from one deck
+    There are 6,175 of them for 5 cards
+    """
+    for ranks in combinations_with_replacement(range(NUM_RANKS), size):
+        if max(Counter(ranks).values()) <= NUM_SUITS:
+            yield ranks
+
+
+def build_rank_table(sizes=(4, 5)):
+    table = {}
+    for size in sizes:
+        keys = np.array(list(rank_multisets(size)))
+        table.update(zip(map(tuple, keys.tolist()), score_rank_arrays(keys).tolist()))
+    return table
+
+
+def rank_array_index(ranks):
+    """
+    Reads the sorted ranks along the last axis as a base 13 number
+    """
+    index = np.zeros(ranks.shape[:-1], dtype=np.intp)
+    for i in range(ranks.shape[-1]):
+        index = index * NUM_RANKS + ranks[..., i]
+    return index
+
+
+def build_rank_array(size=5):
+    """
+    RANK_TABLE for hands of size cards as a flat array indexed by
+    rank_array_index(), so whole arrays of hands can be looked up at once
+    """
+    array = np.zeros(NUM_RANKS ** size, dtype=np.int8)
+    keys = np.array(list(rank_multisets(size)))
+    array[rank_array_index(keys)] = score_rank_arrays(keys)
+    return array
+
+
+# Module attributes that are built on first use, see __getattr__()
+_LAZY_TABLES = {
+    'RANK_TABLE': build_rank_table,
+    'RANK_ARRAY': build_rank_array,
+    'RANK_ARRAY_4': lambda: build_rank_array(4),  # Four card hands, no cut
+}
+
+
+def __getattr__(name):
+    """
+    Builds RANK_TABLE or a RANK_ARRAY the first time it's asked for and keeps
+    it as a module attribute, so later lookups never come back here.
+    Use scoring.RANK_TABLE rather than importing the name, which would build
+    it on import
+    """
+    try:
+        build = _LAZY_TABLES[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+
+    value = globals()[name] = build()
+    return value
+
+
+def _lazy_table(name):
+    """
+    The same as reading the module attribute, for use inside this module
+    where plain global lookups don't go through __getattr__()
+    """
+    try:
+        return globals()[name]
+    except KeyError:
+        return __getattr__(name)
+
+
+def fill_ups(rank_counts, num_fill, rank=0):
+    """
+    Yields (ranks, ways) for every multiset of num_fill ranks that can be
+    drawn from rank_counts, along with the number of ways to draw it
+    """
+    if num_fill == 0:
+        yield (), 1
+        return
+    if rank == NUM_RANKS:
+        return
+
+    available = rank_counts[rank]
+    for num in range(min(available, num_fill) + 1):
+        ways = comb(available, num)
+        for ranks, rest_ways in fill_ups(rank_counts, num_fill - num, rank + 1):
+            yield (rank,) * num + ranks, ways * rest_ways
+
+
+@lru_cache(maxsize=65536)
+def expected_rank_points(known_ranks, rank_counts, num_fill, score_ranks=None):
+    """
+    Exact expectation of the 15s, pairs and runs of known_ranks once
+    num_fill cards and then a cut card are drawn from a deck holding
+    rank_counts[rank] cards of each rank
+    Every draw of the same ranks scores the same, so each multiset of ranks is
+    only scored once and weighted by how many draws it stands for.
+    score_ranks scores a sorted tuple of ranks, RANK_TABLE by default
+    """
+    if score_ranks is None:
+        score_ranks = _lazy_table('RANK_TABLE').__getitem__
+
+    total = 0
+    num = 0
+
+    for fill, ways in fill_ups(rank_counts, num_fill):
+        hand_ranks = known_ranks + fill
+        for cut_rank in range(NUM_RANKS):
+            cut_ways = rank_counts[cut_rank] - fill.count(cut_rank)
+            if cut_ways <= 0:
+                continue
+            ranks = tuple(sorted(hand_ranks + (cut_rank,)))
+            total += score_ranks(ranks) * ways * cut_ways
+            num += ways * cut_ways
+
+    return total / num
+
+
+def expected_suit_points(known_suits, known_jack_suits, suit_counts,
+                         remaining_jack_suits, num_fill, is_crib=False):
+    """
+    Exact expectation of the flush and nobs points, given the suits of the
+    known cards and of the cards left to draw from
+    A crib only scores a flush if the cut is in the suit too
+    """
+    num_remaining = sum(suit_counts)
+    num_after_fill = num_remaining - num_fill
+
+    total = 0.0
+
+    # Flush, every card in the hand needs to share a suit
+    if known_suits:
+        flush_suits = {known_suits[0]} if len(set(known_suits)) == 1 else set()
+    else:
+        flush_suits = range(NUM_SUITS)
+
+    for suit in flush_suits:
+        available = suit_counts[suit]
+        if available < num_fill:
+            continue
+        p_flush = comb(available, num_fill) / comb(num_remaining, num_fill)
+        p_cut_matches = (available - num_fill) / num_after_fill
+        if is_crib:
+            total += p_flush * p_cut_matches * 5
+        else:
+            total += p_flush * (4 + p_cut_matches)
+
+    # Nobs, the cut is equally likely to be any card not in the hand
+    for suit in known_jack_suits:
+        total += suit_counts[suit] / num_remaining
+
+    if num_fill:
+        p_in_hand = num_fill / num_remaining
+        for suit in remaining_jack_suits:
+            total += p_in_hand * (suit_counts[suit] - 1) / (num_remaining - 1)
+
+    return total
+
+
+def _window_products(counts, length):
+    """
+    For every stretch of length ranks in a row, the product of the counts of
+    those ranks, as an N x (14 - length) array
+    """
+    products = counts[:, :NUM_RANKS - length + 1].copy()
+    for offset in range(1, length):
+        products *= counts[:, offset:NUM_RANKS - length + 1 + offset]
+    return products
+
+
+def score_rank_arrays(ranks):
+    """
+    15s, pairs and runs of N hands of up to five cards at once, given as an
+    N x size array of rank indexes. This is what fills in the tables
+    """
+    ranks = np.asarray(ranks, dtype=np.int8)
+    num, size = ranks.shape
+
+    # 15s, the sum of every subset at once
+    subset_sums = RANK_VALUE_ARRAY[ranks] @ SUBSETS[:size, :2 ** size]
+    total = 2 * (subset_sums == 15).sum(axis=1, dtype=np.int16)
+
+    # Pairs
+    for first, second in combinations(range(size), 2):
+        total += 2 * (ranks[:, first] == ranks[:, second])
+
+    # Runs, five cards can only hold one, so the longest length that has a
+    # stretch of ranks all present is the run. Its score is the length times
+    # the product of the counts, and only one stretch of that length can be
+    # nonzero
+    counts = np.zeros((num, NUM_RANKS), dtype=np.int16)
+    rows = np.arange(num)
+    for i in range(size):
+        counts[rows, ranks[:, i]] += 1
+
+    run_points = np.zeros(num, dtype=np.int16)
+    found = np.zeros(num, dtype=bool)
+    for length in range(size, 2, -1):
+        points = length * _window_products(counts, length).sum(axis=1)
+        new = ~found & (points > 0)
+        run_points[new] = points[new]
+        found |= new
+    total += run_points
+
+    return total
+
+
+def score_hands(cards, is_crib=None):
+    """
+    Counts N hands at once. cards is an N x 5 array of serialized cards, the
+    four in the hand and then the cut card, and is_crib says which of them are
+    cribs, which only score a flush if the cut matches it too
+    Returns the N counts, the same as CribbageHand.count()
+    """
+    cards = np.asarray(cards)
+    assert cards.ndim == 2 and cards.shape[1] == 5
+    num = len(cards)
+    if is_crib is None:
+        is_crib = np.zeros(num, dtype=bool)
+    is_crib = np.asarray(is_crib, dtype=bool)
+
+    ranks = (cards % NUM_RANKS).astype(np.int8)
+    suits = (cards // NUM_RANKS).astype(np.int8)
+
+    total = score_rank_arrays(ranks)
+
+    # Flush
+    hand_suits = suits[:, :4]
+    flush = (hand_suits == hand_suits[:, :1]).all(axis=1)
+    cut_matches = suits[:, 4] == suits[:, 0]
+    total += np.where(is_crib, 5 * (flush & cut_matches), flush * (4 + cut_matches))
+
+    # Nobs
+    nobs = (ranks[:, :4] == JACK) & (hand_suits == suits[:, 4:])
+    total += nobs.any(axis=1)
+
+    return total
+
+
+def pegging_points(ranks, count, rank, num_same_rank):
+    """
+    Points scored by playing rank onto a pegging pile holding ranks, whose
+    count is count and whose top num_same_rank cards share a rank
+    """
+    points = 0
+
+    # 15 and 31
+    count += RANK_VALUES[rank]
+    if count == 15 or count == PEGGING_LIMIT:
+        points += 2
+
+    # Pairs, trips and quads
+    if ranks and ranks[-1] == rank:
+        points += PAIR_POINTS[num_same_rank + 1]
+
+    # Runs, the longest run of distinct ranks ending with this card.
+    # Stops at the first repeated rank, and the pile can't hold more than
+    # 13 cards before reaching 31, so this is bounded
+    run = 0
+    seen = 1 << rank
+    low = high = rank
+    length = 1
+    for other in reversed(ranks):
+        bit = 1 << other
+        if seen & bit:
+            break
+        seen |= bit
+        length += 1
+        if other < low:
+            low = other
+        elif other > high:
+            high = other
+        if length >= 3 and high - low == length - 1:
+            run = length
+
+    return points + run
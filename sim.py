@@ -0,0 +1,292 @@
+"""
+Headless Cribbage, for playing huge numbers of games between AIs
+Nothing is printed or asked for: randomness comes from an injected rng and
+every decision comes from a policy, so the same seed always plays out the
+same game
+
+A throwing policy is called as policy(full_hand, is_dealer, rng) and returns
+the two indexes of full_hand to throw into the crib.
+A pegging policy is called as policy(pegging_hand, playable, pile, rng, info),
+only when at least one card is playable, and returns the card from playable to
+put down. pile.history and pile.gos hold everything pegged and every go said
+this hand, with players as 0 and 1, and info is a PegInfo with the rest of
+what the player could know
+"""
+import random
+from collections import namedtuple
+
+from card import CribbageCard, CribbageDeck, CribbageHand, CribbagePeggingPile
+from discard import best_discard
+from pegging_mc import MonteCarloPegger
+
+WINNING_SCORE = 121
+HAND_SIZE = 4
+
+GameResult = namedtuple('GameResult', [
+    'winner',        # Index of the player that won
+    'scores',        # Final score of each player
+    'num_hands',     # Number of hands dealt
+    'first_dealer',  # Index of the player that dealt first
+])
+
+PegInfo = namedtuple('PegInfo', [
+    'player',              # Index of the player choosing
+    'cut_card',            # The card cut this hand
+    'thrown',              # The cards this player threw into the crib
+    'num_opponent_cards',  # How many cards the other player has left
+    'last_player',         # Index of whoever played the last card, None before anyone has
+])
+
+
+def random_throw(full_hand, is_dealer, rng):
+    # Two distinct indexes, without the overhead of rng.sample()
+    num = len(full_hand)
+    first = int(rng.random() * num)
+    second = int(rng.random() * (num - 1))
+    if second >= first:
+        second += 1
+    return first, second
+
+
+def best_throw(full_hand, is_dealer, rng):
+    """
+    The exact best discard, see discard.py
+    """
+    return best_discard(full_hand, is_dealer)
+
+
+class ClassifierThrow:
+    """
+    Adapts anything with a throw(is_dealer, serialized_card_array) method,
+    like the classifiers in throwing_ai.py, into a throwing policy
+    """
+    def __init__(self, classifier):
+        self.classifier = classifier
+
+    def __call__(self, full_hand, is_dealer, rng):
+        return self.classifier.throw(is_dealer, [card.serialize() for card in full_hand])
+
+
+def random_peg(pegging_hand, playable, pile, rng, info):
+    return playable[int(rng.random() * len(playable))]
+
+
+def greedy_peg(pegging_hand, playable, pile, rng, info):
+    """
+    Plays whatever scores the most right now, the highest card on ties
+    """
+    return max(playable, key=lambda card: (pile.points_for(card), card.value))
+
+
+class MonteCarloPeg:
+    """
+    Adapts a MonteCarloPegger, see pegging_mc.py, into a pegging policy.
+    It only gets told what the player could know, like RoboCribbagePeggerPlayer.
+    The pegger is made on the first move so the policy can be pickled over to
+    tournament.py's worker processes
+    """
+    def __init__(self, **pegger_kwargs):
+        self.pegger_kwargs = pegger_kwargs
+        self._pegger = None
+
+    def __getstate__(self):
+        return {'pegger_kwargs': self.pegger_kwargs, '_pegger': None}
+
+    def __call__(self, pegging_hand, playable, pile, rng, info):
+        if self._pegger is None:
+            self._pegger = MonteCarloPegger(**self.pegger_kwargs)
+        pegger = self._pegger
+        pegger.rng = rng  # Samples from the game's rng, so seeded games repeat
+
+        seen = set(pegging_hand) | set(info.thrown) | set(pile.history)
+        seen.add(info.cut_card)
+        unseen_cards = [card for card in CribbageCard.all() if card not in seen]
+
+        go_counts = [count for player, count in pile.gos if player != info.player]
+
+        return pegger.choose(
+            pegging_hand,
+            list(pile),
+            unseen_cards,
+            info.num_opponent_cards,
+            len(pile) > 0 and info.last_player == info.player,
+            min(go_counts, default=None),  # Every card left was too big even then
+        )
+
+
+class HeadlessGame:
+    def __init__(self, throw_policies, peg_policies, rng=None, deal_rng=None):
+        """
+        rng is handed to the policies, deal_rng shuffles the deck and picks the
+        first dealer. Giving two games the same deal_rng seed deals them the
+        same cards no matter what the policies do
+        """
+        if len(throw_policies) != 2 or len(peg_policies) != 2:
+            raise NotImplementedError("Only two players allowed")
+
+        self.throw_policies = throw_policies
+        self.peg_policies = peg_policies
+        self.rng = rng if rng is not None else random.Random()
+        self.deal_rng = deal_rng if deal_rng is not None else self.rng
+
+        self._deck = CribbageDeck()
+        self._pile = CribbagePeggingPile()
+        self._hand = CribbageHand()  # Reused for counting
+        self._scores = [0, 0]
+        self._thrown = [[], []]
+        self._cut_card = None
+
+    def _score(self, player, points):
+        """
+        Returns True once player has won
+        """
+        self._scores[player] += points
+        return self._scores[player] >= WINNING_SCORE
+
+    def _throw(self, player, full_hand, is_dealer, crib):
+        indexes = self.throw_policies[player](full_hand, is_dealer, self.rng)
+        indexes = {int(index) for index in indexes}
+        assert len(indexes) == len(full_hand) - HAND_SIZE
+
+        thrown = [full_hand[i] for i in indexes]
+        self._thrown[player] = thrown
+        crib.extend(thrown)
+        return [card for i, card in enumerate(full_hand) if i not in indexes]
+
+    def _peg_card(self, player, hands, playable, pile, last_player):
+        """
+        Asks player's pegging policy for a card, a method so the decisions
+        can be timed by instrument.py
+        """
+        info = PegInfo(
+            player, self._cut_card, self._thrown[player], len(hands[1 - player]), last_player,
+        )
+        return self.peg_policies[player](hands[player], playable, pile, self.rng, info)
+
+    def _peg(self, hands, pone):
+        """
+        Plays out the pegging, returns True if someone won during it
+        """
+        pile = self._pile
+        pile.clear()  # Also forgets the last hand's history
+        limit = pile.PEGGING_LIMIT
+        peg_card = self._peg_card
+        score = self._score
+
+        hands = [hands[0][:], hands[1][:]]
+        turn = pone
+        last_player = None
+
+        while hands[0] or hands[1]:
+            count = pile.count()
+            playable = [card for card in hands[turn] if count + card.value <= limit]
+
+            if playable:
+                card = peg_card(turn, hands, playable, pile, last_player)
+                hands[turn].remove(card)
+                last_player = turn
+                if score(turn, pile.add(card)):
+                    return True
+                if pile.count() == limit:  # 31 was scored by the pile
+                    pile.reset()
+            else:
+                if hands[turn]:
+                    pile.say_go(turn)
+                other = 1 - turn
+                other_count = pile.count()
+                if not any(other_count + card.value <= limit for card in hands[other]):
+                    # Nobody can play, the last player gets one for the go
+                    if score(last_player, 1):
+                        return True
+                    pile.reset()
+                    turn = last_player  # Flipped to the other player below
+
+            turn = 1 - turn
+
+        # One for the last card, unless it made 31
+        if len(pile) and self._score(last_player, 1):
+            return True
+        pile.reset()
+        return False
+
+    def play(self, first_dealer=None):
+        rng = self.deal_rng
+        deck = self._deck
+        self._scores = [0, 0]
+
+        if first_dealer is None:
+            first_dealer = rng.randint(0, 1)
+        dealer = first_dealer
+        num_hands = 0
+
+        while True:
+            num_hands += 1
+            pone = 1 - dealer
+
+            deck.shuffle(rng, num_cards=13)  # Two hands and a cut
+            crib = []
+            hands = [None, None]
+            for player in (pone, dealer):
+                hands[player] = self._throw(player, deck.deal(6), player == dealer, crib)
+
+            cut_card = self._cut_card = deck.draw()
+            if cut_card.rank == 'Jack' and self._score(dealer, 2):  # His heels
+                break
+
+            if self._peg(hands, pone):
+                break
+
+            # The pone counts first, then the dealer, then the crib
+            hand = self._hand
+            hand.cards = hands[pone]
+            if self._score(pone, hand.count(cut_card)):
+                break
+            hand.cards = hands[dealer]
+            if self._score(dealer, hand.count(cut_card)):
+                break
+            hand.cards = crib
+            if self._score(dealer, hand.count(cut_card, is_crib=True)):
+                break
+
+            dealer = pone
+
+        scores = tuple(self._scores)
+        winner = 0 if scores[0] >= WINNING_SCORE else 1
+        return GameResult(winner, scores, num_hands, first_dealer)
+
+
+def play_games(num_games, throw_policies, peg_policies, seed=0):
+    """
+    Yields the result of num_games games, with the first dealer alternating
+    With random policies this plays about 1,400 games a second on one core,
+    well short of 10,000. A game is about 12 hands of about 8 pegging plays
+    each, and the time is spread over that per card Python work: calling the
+    policy with its PegInfo, scoring the play onto the pile, and counting
+    three hands a deal.
+    Smarter policies cost far more than the engine. For more games run them
+    over several processes with tournament.py
+    """
+    game = HeadlessGame(throw_policies, peg_policies, random.Random(seed))
+    for i in range(num_games):
+        yield game.play(first_dealer=i % 2)
+
+
+def main():
+    import time
+
+    num_games = 1000
+    start = time.perf_counter()
+    results = list(play_games(
+        num_games,
+        [random_throw, random_throw],
+        [random_peg, random_peg],
+    ))
+    elapsed = time.perf_counter() - start
+
+    wins = sum(result.winner == 0 for result in results)
+    print(f"{num_games} games in {elapsed:.2f}s ({num_games / elapsed:.0f}/s)")
+    print(f"Player 0 won {wins}, player 1 won {num_games - wins}")
+
+
+if __name__ == '__main__':
+    main()
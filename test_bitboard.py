@@ -0,0 +1,31 @@
+import random
+
+import scoring
+from bitboard import score_ranks
+from card import CribbageCard, CribbageHand
+
+
+def test_score_ranks_matches_rank_table():
+    for ranks, points in scoring.RANK_TABLE.items():
+        assert score_ranks(ranks) == points, ranks
+
+
+def test_count_matches_reference():
+    rng = random.Random(0)
+    deck = CribbageCard.all()
+    hand = CribbageHand()
+    for _ in range(20000):
+        if rng.random() < 0.1:  # Flushes are rare otherwise
+            suit = rng.choice(CribbageCard.SUITS)
+            hand.cards = rng.sample([card for card in deck if card.suit == suit], 4)
+            cut_card = rng.choice([card for card in deck if card not in hand.cards])
+        else:
+            *hand.cards, cut_card = rng.sample(deck, 5)
+        if rng.random() < 0.25:
+            cut_card = None
+        is_crib = rng.random() < 0.5
+
+        expected = hand._count_reference(cut_card, is_crib)
+        assert hand.count(cut_card, is_crib) == expected, f"{hand.cards} cut {cut_card}"
+        assert hand.count(cut_card, is_crib, backend='bitboard') == expected, \
+            f"{hand.cards} cut {cut_card}"
@@ -0,0 +1,51 @@
+import random
+
+from canonical import CanonicalMemo, canonicalize
+from card import CribbageCard
+
+
+def relabel_suits(cards, permutation):
+    return [CribbageCard.deserialize(permutation[card.suit_index] * 13 + card.rank_index)
+            for card in cards]
+
+
+def test_isomorphic_hands_share_a_key():
+    rng = random.Random(0)
+    deck = CribbageCard.all()
+    for _ in range(200):
+        cards = rng.sample(deck, 6)
+        permutation = rng.sample(range(4), 4)
+        relabeled = relabel_suits(cards, permutation)
+
+        (key, dead), ids = canonicalize(cards)
+        (other_key, _), other_ids = canonicalize(relabeled)
+        assert key == other_key
+        assert dead == ()
+        # Each card maps onto a canonical card of the same rank
+        assert [num % 13 for num in ids] == [card.rank_index for card in cards]
+        assert sorted(ids) == sorted(other_ids)
+
+
+def test_dead_cards_tell_hands_apart():
+    spades = [CribbageCard('Five', 'Spades'), CribbageCard('Six', 'Spades')]
+    hearts_dead = [CribbageCard('Seven', 'Hearts')]
+    spades_dead = [CribbageCard('Seven', 'Spades')]
+    assert canonicalize(spades, hearts_dead)[0] != canonicalize(spades, spades_dead)[0]
+
+
+def test_memo_evicts_least_recently_used(tmp_path):
+    memo = CanonicalMemo(maxsize=2)
+    assert memo.get('a', lambda: 1) == 1
+    assert memo.get('b', lambda: 2) == 2
+    assert memo.get('a', lambda: None) == 1  # Refreshes a
+    memo.get('c', lambda: 3)
+
+    assert 'a' in memo and 'c' in memo and 'b' not in memo
+    assert (memo.hits, memo.misses) == (1, 3)
+    assert memo.hit_rate == 0.25
+
+    path = tmp_path / 'memo.pickle'
+    memo.dump(path)
+    loaded = CanonicalMemo()
+    loaded.load(path)
+    assert loaded.get('c', lambda: None) == 3
@@ -0,0 +1,67 @@
+import random
+
+import numpy as np
+import pytest
+
+from dataset import (
+    DatasetWriter,
+    deal_rows,
+    load_dataset,
+    load_training_data,
+    read_batches,
+    stream_batches,
+)
+from discard import DISCARDS
+
+
+def test_deal_rows_hold_the_best_discard():
+    for row in deal_rows(4, random.Random(0), with_values=True):
+        is_dealer, cards, thrown, values = row[0], row[1:7], tuple(row[7:9]), row[9:]
+        assert is_dealer in (0, 1)
+        assert len(set(cards)) == 6
+        assert len(values) == len(DISCARDS)
+        assert values[DISCARDS.index(thrown)] == max(values)
+
+
+def test_stream_batches_are_repeatable():
+    first = list(stream_batches(10, batch_rows=4, seed=1))
+    second = list(stream_batches(10, batch_rows=4, seed=1))
+    assert [len(batch) for batch in first] == [4, 4, 2]
+    for a, b in zip(first, second):
+        assert np.array_equal(a, b)
+
+
+def test_binary_round_trip(tmp_path):
+    path = str(tmp_path / 'dataset.bin')
+    rows = list(deal_rows(6, random.Random(2)))
+
+    with DatasetWriter(path, chunk_rows=4) as writer:
+        writer.writerows(rows)
+    assert [p.name for p in tmp_path.iterdir()] == ['dataset.bin']
+
+    data = load_dataset(path)
+    assert len(data) == 6
+    features, thrown = load_training_data(path)
+    assert features.tolist() == [row[:7] for row in rows]
+    assert thrown.tolist() == [row[7:9] for row in rows]
+
+    batches = list(read_batches(path, batch_rows=4))
+    assert np.array_equal(np.concatenate(batches), np.array(data))
+
+
+def test_failed_write_leaves_nothing_behind(tmp_path):
+    path = str(tmp_path / 'dataset.bin')
+    with pytest.raises(RuntimeError):
+        with DatasetWriter(path) as writer:
+            writer.writerow(next(deal_rows(1, random.Random(3))))
+            raise RuntimeError
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_csv_batches(tmp_path):
+    path = tmp_path / 'dataset.csv'
+    rows = list(deal_rows(5, random.Random(4)))
+    path.write_text(''.join(','.join(map(str, row)) + '\n' for row in rows))
+
+    batch, = read_batches(str(path), batch_rows=10)
+    assert batch['cards'].tolist() == [row[1:7] for row in rows]
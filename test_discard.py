@@ -0,0 +1,96 @@
+import random
+
+import pytest
+
+from card import CribbageCard, CribbageDeck, CribbageHand
+from crib_table import gen_crib_table, crib_value, load_crib_table, save_crib_table, table_key
+from discard import DISCARDS, best_discard, discard_value, optimal_discard, split_values
+
+
+@pytest.fixture(scope='module')
+def crib_table():
+    return gen_crib_table()
+
+
+def deal_hands(num_hands, seed=0):
+    deck = CribbageDeck()
+    rng = random.Random(seed)
+    for _ in range(num_hands):
+        deck.shuffle(rng)
+        yield deck.deal(6)
+
+
+def test_split_values_match_predict():
+    for full_hand in deal_hands(3):
+        remaining_cards = [card for card in CribbageCard.all() if card not in full_hand]
+        for (avg_hand, avg_crib), thrown_indexes in zip(split_values(full_hand), DISCARDS):
+            kept = [card for i, card in enumerate(full_hand) if i not in thrown_indexes]
+            thrown = [full_hand[i] for i in thrown_indexes]
+            assert avg_hand == pytest.approx(CribbageHand(kept).predict(remaining_cards))
+            assert avg_crib == pytest.approx(
+                CribbageHand(thrown).predict(remaining_cards, is_crib=True)
+            )
+
+
+def test_backends_agree():
+    for full_hand in deal_hands(3, seed=1):
+        for is_dealer in (False, True):
+            expected = optimal_discard(full_hand, is_dealer)
+            actual = optimal_discard(full_hand, is_dealer, backend='numpy')
+            assert [indexes for _, indexes in actual] == [indexes for _, indexes in expected]
+            assert [value for value, _ in actual] == \
+                pytest.approx([value for value, _ in expected])
+
+
+def test_optimal_discard_follows_the_cards():
+    for full_hand in deal_hands(10, seed=2):
+        results = optimal_discard(full_hand, True)
+        assert sorted(indexes for _, indexes in results) == DISCARDS
+        assert [value for value, _ in results] == sorted(
+            (value for value, _ in results), reverse=True,
+        )
+
+        # Reordering the hand reorders the indexes with it
+        order = list(range(6))
+        random.Random(0).shuffle(order)
+        shuffled = [full_hand[i] for i in order]
+        first, second = best_discard(shuffled, True)
+        assert {shuffled[first], shuffled[second]} == \
+            {full_hand[i] for i in best_discard(full_hand, True)}
+
+
+def test_discard_value():
+    full_hand = next(deal_hands(1, seed=3))
+    value, indexes = optimal_discard(full_hand, False)[0]
+    assert discard_value(full_hand, indexes[::-1], False) == value
+    with pytest.raises(ValueError):
+        discard_value(full_hand, (0, 0), False)
+
+
+def test_crib_table_matches_predict(crib_table):
+    thrown = [CribbageCard('Five', 'Hearts'), CribbageCard('Jack', 'Hearts')]
+    remaining_cards = [card for card in CribbageCard.all() if card not in thrown]
+    expected = CribbageHand(thrown).predict(remaining_cards, is_crib=True)
+    assert crib_value(crib_table, thrown) == pytest.approx(expected)
+    assert crib_value(crib_table, thrown[::-1]) == pytest.approx(expected)
+
+
+def test_crib_table_memoized_apart(crib_table):
+    full_hand = next(deal_hands(1, seed=4))
+    exact = optimal_discard(full_hand, True)
+    approximate = optimal_discard(full_hand, True, crib_table=crib_table)
+    assert approximate != exact
+
+    doubled = crib_table * 2
+    assert table_key(doubled) != table_key(crib_table)
+    assert optimal_discard(full_hand, True, crib_table=doubled) != approximate
+
+
+def test_crib_table_saves_and_loads_once(tmp_path):
+    path = str(tmp_path / 'crib_table.npy')
+    table = save_crib_table(path)
+    loaded = load_crib_table(path)
+    assert (loaded == table).all()
+    assert load_crib_table(path) is loaded
+    assert table_key(loaded) == table_key(table)
+    assert [p.name for p in tmp_path.iterdir()] == ['crib_table.npy']
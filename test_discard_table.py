@@ -0,0 +1,64 @@
+import pickle
+import random
+
+import numpy as np
+import pytest
+
+import discard_table
+from card import CribbageCard
+from discard import optimal_discard
+from discard_table import DiscardTable, canonical_hands, gen_table
+from scoring import rank_multisets
+
+RANKS = [(0, 0, 4, 5, 9, 10), (2, 3, 4, 4, 11, 12)]
+
+
+@pytest.fixture(scope='module')
+def small_table(tmp_path_factory):
+    """
+    A table of just the hands with RANKS
+    """
+    path = str(tmp_path_factory.mktemp('table') / 'discard_table.bin')
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(discard_table, 'rank_multisets', lambda size: RANKS)
+        gen_table(path, processes=1, shard_size=1)
+    return DiscardTable(path)
+
+
+def test_table_matches_optimal_discard(small_table):
+    rng = random.Random(0)
+    assert len(small_table) == sum(len(canonical_hands(ranks)) for ranks in RANKS)
+
+    for ranks in RANKS:
+        for _ in range(5):
+            suits = rng.sample(range(4), 4)
+            full_hand = [
+                CribbageCard.deserialize(num)
+                for num in {suits[rng.randrange(4)] * 13 + rank for rank in ranks}
+            ]
+            if len(full_hand) < 6:
+                continue  # Dealt the same card twice
+            for is_dealer in (False, True):
+                # Stored as float32, so ties can come out in another order
+                expected = {indexes: value for value, indexes in
+                            optimal_discard(full_hand, is_dealer)}
+                actual = {indexes: value for value, indexes in
+                          small_table.evaluate_discards(full_hand, is_dealer)}
+                assert actual == pytest.approx(expected, abs=1e-4)
+
+
+def test_missing_hand(small_table):
+    full_hand = [CribbageCard.deserialize(num) for num in range(6)]
+    with pytest.raises(KeyError):
+        small_table.best_discard(full_hand, True)
+
+
+def test_pickles_as_its_path(small_table):
+    data = pickle.dumps(small_table)
+    assert len(data) < 1000
+    assert np.array_equal(pickle.loads(data).keys, small_table.keys)
+
+
+@pytest.mark.slow
+def test_canonical_hand_count():
+    assert sum(len(canonical_hands(ranks)) for ranks in rank_multisets(6)) == 962988
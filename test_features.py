@@ -0,0 +1,64 @@
+import random
+
+import numpy as np
+
+from canonical import CanonicalMemo
+from card import CribbageCard, CribbageHand
+from discard import DISCARDS
+from features import (
+    NUM_HAND_FEATURES,
+    discard_features,
+    hand_features,
+    kept_scores,
+    throw_features,
+)
+
+
+def deal_matrix(num_hands, seed=0):
+    rng = random.Random(seed)
+    return np.array([rng.sample(range(52), 6) for _ in range(num_hands)])
+
+
+def test_kept_scores_match_count():
+    cards_matrix = deal_matrix(50)
+    scores = kept_scores(cards_matrix)
+    hand = CribbageHand()
+    for row, row_scores in zip(cards_matrix.tolist(), scores):
+        for thrown_indexes, score in zip(DISCARDS, row_scores):
+            hand.cards = [CribbageCard.deserialize(num) for i, num in enumerate(row)
+                          if i not in thrown_indexes]
+            assert score == hand.count()
+
+
+def test_memo_gives_the_same_features():
+    cards_matrix = deal_matrix(200)
+    expected = hand_features(cards_matrix, memo=None)
+    assert expected.shape == (200, NUM_HAND_FEATURES)
+
+    memo = CanonicalMemo(maxsize=50)  # Smaller than a batch
+    assert np.array_equal(hand_features(cards_matrix, memo), expected)
+    assert np.array_equal(hand_features(cards_matrix, memo), expected)
+    assert memo.hits > 0
+
+
+def test_memo_follows_the_card_order():
+    cards_matrix = deal_matrix(20, seed=1)
+    memo = CanonicalMemo()
+    hand_features(cards_matrix, memo)
+
+    reversed_matrix = cards_matrix[:, ::-1]
+    assert np.array_equal(
+        hand_features(reversed_matrix, memo), hand_features(reversed_matrix, memo=None),
+    )
+
+
+def test_feature_shapes():
+    cards_matrix = deal_matrix(5)
+    is_dealer_array = [0, 1, 0, 1, 1]
+    features = throw_features(is_dealer_array, cards_matrix, memo=None)
+    assert features.shape == (5, 7 + NUM_HAND_FEATURES)
+    assert (features[:, 0] == is_dealer_array).all()
+
+    features = discard_features(is_dealer_array, cards_matrix)
+    assert features.shape[:2] == (5, len(DISCARDS))
+    assert (features[:, :, 0] == np.array(is_dealer_array)[:, None]).all()
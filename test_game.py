@@ -0,0 +1,40 @@
+import random
+
+from card import CribbageCard, CribbageDeck
+from discard import best_discard
+from game import CribbageGame, RoboCribbagePlayer
+
+
+class OptimalThrowingClassifier:
+    """
+    Throws what optimal_discard() picks, as 0-based indexes like the real
+    classifiers
+    """
+    def throw(self, is_dealer, serialized_card_array):
+        full_hand = [CribbageCard.deserialize(num) for num in serialized_card_array]
+        return list(best_discard(full_hand, is_dealer))
+
+
+def test_robot_throws_the_cards_optimal_discard_picked():
+    players = [RoboCribbagePlayer(1), RoboCribbagePlayer(2)]
+    game = CribbageGame(players)
+    deck = CribbageDeck()
+    rng = random.Random(0)
+
+    for _ in range(50):
+        deck.shuffle(rng)
+        game._crib.cards = []
+        for player in players:
+            player.hand = deck.deal(6)
+            player.throwing_classifier = OptimalThrowingClassifier()
+
+            full_hand = list(player.hand.cards)
+            indexes = best_discard(full_hand, player is game.dealer)
+            expected = [full_hand[index] for index in indexes]
+
+            player.throw_away_cards()
+
+            assert player.thrown == expected
+            assert game.crib.cards[-2:] == expected
+            assert all(card not in player.hand.cards for card in expected)
+            assert len(player.hand) == 4
@@ -0,0 +1,130 @@
+import random
+import time
+
+import pytest
+
+from card import CribbageCard
+from pegging_mc import MonteCarloPegger
+from pegging_solver import PeggingSolver, SolverTimeout, num_same_rank
+
+
+def card(rank, suit='Spades'):
+    return CribbageCard(rank, suit)
+
+
+def test_num_same_rank():
+    assert num_same_rank(()) == 0
+    assert num_same_rank((3,)) == 1
+    assert num_same_rank((2, 3, 3, 3)) == 3
+
+
+def test_solver_scores_the_obvious_play():
+    solver = PeggingSolver()
+    # Our Five goes first, their Ten makes 15 and the last card
+    assert solver.value([card('Five')], [card('Ten')]) == -3
+    # Leading the Ten instead, they make 15 with the Five
+    assert solver.card_values([card('Ten')], [card('Five')]) == {9: -3}
+
+
+def test_solver_picks_the_fifteen():
+    solver = PeggingSolver()
+    pile = [card('Ten', 'Hearts')]
+    best = solver.best_card([card('Five'), card('Two')], [card('King', 'Hearts')], pile, False)
+    assert best == card('Five')
+
+
+def test_solver_with_nothing_playable():
+    solver = PeggingSolver()
+    pile = [card('King'), card('Queen'), card('Nine')]  # 29
+    assert solver.best_card([card('Four')], [card('Six', 'Hearts')], pile) is None
+
+
+def test_solver_gives_up_at_the_deadline():
+    solver = PeggingSolver()
+    my_cards = [card(rank) for rank in ('Ace', 'Two', 'Three', 'Four')]
+    opponent_cards = [card(rank, 'Hearts') for rank in ('Ace', 'Two', 'Three', 'Four')]
+    with pytest.raises(SolverTimeout):
+        solver.card_values(my_cards, opponent_cards, deadline=time.perf_counter() - 1)
+    assert solver.deadline is None
+    assert solver.card_values(my_cards, opponent_cards)  # Still usable afterwards
+
+
+def brute_force(hands, pile, count, turn, last_player):
+    """
+    Pegging value for player 0 by trying every order, no memo
+    """
+    from scoring import PEGGING_LIMIT, RANK_VALUES, pegging_points
+
+    if not hands[0] and not hands[1]:
+        return (1 if last_player == 0 else -1) if pile else 0
+
+    sign = 1 if turn == 0 else -1
+    values = []
+    for i, rank in enumerate(hands[turn]):
+        if count + RANK_VALUES[rank] > PEGGING_LIMIT:
+            continue
+        points = pegging_points(list(pile), count, rank, num_same_rank(pile))
+        new_hands = list(hands)
+        new_hands[turn] = hands[turn][:i] + hands[turn][i + 1:]
+        new_count = count + RANK_VALUES[rank]
+        if new_count == PEGGING_LIMIT:
+            child = brute_force(tuple(new_hands), (), 0, 1 - turn, turn)
+        else:
+            child = brute_force(tuple(new_hands), pile + (rank,), new_count, 1 - turn, turn)
+        values.append(sign * points + child)
+    if values:
+        return max(values) if turn == 0 else min(values)
+
+    other = 1 - turn
+    if any(count + RANK_VALUES[rank] <= PEGGING_LIMIT for rank in hands[other]):
+        return brute_force(hands, pile, count, other, last_player)
+    go = 1 if last_player == 0 else -1
+    return go + brute_force(hands, (), 0, 1 - last_player, last_player)
+
+
+def test_solver_matches_brute_force():
+    rng = random.Random(0)
+    deck = CribbageCard.all()
+    for _ in range(30):
+        cards = rng.sample(deck, 6)
+        mine, theirs = cards[:3], cards[3:]
+        expected = brute_force((
+            tuple(card.rank_index for card in mine),
+            tuple(card.rank_index for card in theirs),
+        ), (), 0, 0, 1)
+        assert PeggingSolver().value(mine, theirs) == expected
+
+
+def test_monte_carlo_with_the_hand_known():
+    # Only as many unseen cards as they hold, so every sample is the truth
+    rng = random.Random(1)
+    deck = CribbageCard.all()
+    pegger = MonteCarloPegger(time_budget=5, max_samples=3, rng=rng)
+    for _ in range(10):
+        cards = rng.sample(deck, 7)
+        mine, theirs = cards[:4], cards[4:]
+        expected = PeggingSolver().card_values(mine, theirs)
+        chosen = pegger.choose(mine, [], theirs, len(theirs))
+        assert expected[chosen.rank_index] == max(expected.values())
+
+
+def test_monte_carlo_falls_back_to_greedy():
+    pegger = MonteCarloPegger(time_budget=0)
+    pile = [card('Ten', 'Hearts')]
+    unseen = [c for c in CribbageCard.all() if c not in pile]
+    chosen = pegger.choose([card('Two'), card('Five')], pile, unseen[:20], 4)
+    assert chosen == card('Five')
+
+
+def test_monte_carlo_go_count_rules_out_small_cards():
+    pegger = MonteCarloPegger(time_budget=5, max_samples=20, rng=random.Random(2))
+    seen = []
+
+    def card_values(my_cards, opponent_cards, *args):
+        seen.append(opponent_cards)
+        return {my_cards[0].rank_index: 0}
+
+    pegger.solver.card_values = card_values
+    unseen = [card(rank, 'Hearts') for rank in ('Ace', 'Two', 'King', 'Queen')]
+    pegger.choose([card('Three')], [], unseen, 2, opponent_go_count=25)
+    assert seen and all(c.value == 10 for sample in seen for c in sample)
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from qstore import (
+    DenseQStore,
+    SparseQStore,
+    load_checkpoint,
+    load_readonly,
+    load_store,
+    save_checkpoint,
+)
+
+NUM_STATES = 1000
+NUM_ACTIONS = 4
+
+
+def random_updates(num_batches=20, seed=0):
+    rng = np.random.default_rng(seed)
+    for _ in range(num_batches):
+        states = rng.integers(0, NUM_STATES, 64)
+        actions = rng.integers(0, NUM_ACTIONS, 64)
+        yield states, actions, rng.random(64).astype(np.float32)
+
+
+def filled_stores():
+    dense = DenseQStore(NUM_STATES, NUM_ACTIONS)
+    sparse = SparseQStore(NUM_ACTIONS, capacity=8)  # Has to grow a few times
+    for states, actions, values in random_updates():
+        for store in (dense, sparse):
+            store.update(states, actions, values)
+    return dense, sparse
+
+
+def test_sparse_matches_dense():
+    dense, sparse = filled_stores()
+    states = np.arange(NUM_STATES)
+    assert np.array_equal(sparse.rows(states), dense.rows(states))
+    assert len(sparse) == int((dense.values != 0).any(axis=1).sum())
+
+    sparse[5] = dense[5] = np.arange(NUM_ACTIONS)
+    assert np.array_equal(sparse[5], dense[5])
+    assert not sparse[NUM_STATES + 1].any()
+
+
+@pytest.mark.parametrize('kind', ['dense', 'sparse'])
+def test_save_and_load(tmp_path, kind):
+    dense, sparse = filled_stores()
+    store = dense if kind == 'dense' else sparse
+    path = str(tmp_path / 'q.npy')
+    store.save(path)
+    assert [p.name for p in tmp_path.iterdir()] == ['q.npy']
+
+    loaded = load_store(path)
+    assert type(loaded) is type(store)
+    states = np.arange(NUM_STATES)
+    assert np.array_equal(loaded.rows(states), dense.rows(states))
+
+    readonly = load_readonly(path)
+    for state in (0, 17, NUM_STATES - 1):
+        assert np.array_equal(readonly[state], dense[state])
+        assert readonly.best_action(state) == int(np.argmax(dense[state]))
+    valid = np.array([True, False, False, True])
+    assert readonly.best_action(3, valid) in (0, 3)
+
+
+def test_checkpoint(tmp_path):
+    path = str(tmp_path / 'q.npy')
+    assert load_checkpoint(path) == (None, 0)
+
+    _, sparse = filled_stores()
+    save_checkpoint(sparse, path, 1234)
+    store, step = load_checkpoint(path)
+    assert step == 1234
+    assert np.array_equal(store.rows(np.arange(NUM_STATES)), sparse.rows(np.arange(NUM_STATES)))
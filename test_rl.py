@@ -0,0 +1,53 @@
+import numpy as np
+
+from qstore import SparseQStore
+from rl import HAND_SIZE, NO_CARD, NUM_STATES, BatchPegEnv, MAX_COUNT, train_batched
+
+
+def test_states_are_in_range_and_distinct():
+    env = BatchPegEnv(batch_size=512, seed=0)
+    states = env.reset()
+    assert ((0 <= states) & (states < NUM_STATES)).all()
+
+    keys = set(zip(map(tuple, env.hands.tolist()), env.top.tolist(), env.count.tolist()))
+    assert len(set(states.tolist())) == len(keys)
+
+
+def test_episodes_play_out():
+    env = BatchPegEnv(batch_size=256, seed=1)
+    env.reset()
+    for _ in range(HAND_SIZE):
+        valid = env.valid_actions()
+        assert valid.any(axis=1).all()  # Stuck piles were started over
+        actions = env.sample_actions(valid)
+        assert valid[np.arange(env.batch_size), actions].all()
+
+        _, reward, done = env.step(actions)
+        assert set(np.unique(reward)) <= {0, 2, 4, 6}
+        assert (env.count <= MAX_COUNT).all()
+    assert done.all()
+    assert (env.hands == NO_CARD).all()
+
+
+def test_sparse_store_trains_like_dense():
+    dense = train_batched(BatchPegEnv(batch_size=64, seed=2), num_steps=200)
+    sparse = train_batched(
+        BatchPegEnv(batch_size=64, seed=2), num_steps=200, store=SparseQStore(HAND_SIZE),
+    )
+    states = np.arange(NUM_STATES)
+    assert np.array_equal(sparse.rows(states), dense.rows(states))
+    assert len(sparse) < NUM_STATES // 10
+
+
+def test_training_resumes_from_checkpoint(tmp_path):
+    path = str(tmp_path / 'q.npy')
+    train_batched(
+        BatchPegEnv(batch_size=32, seed=3), num_steps=50,
+        store=SparseQStore(HAND_SIZE), checkpoint_path=path, checkpoint_every=10,
+    )
+    store = train_batched(
+        BatchPegEnv(batch_size=32, seed=3), num_steps=60,
+        checkpoint_path=path, checkpoint_every=10,
+    )
+    assert isinstance(store, SparseQStore)
+    assert len(store)
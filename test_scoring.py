@@ -0,0 +1,98 @@
+import random
+from itertools import combinations
+
+import numpy as np
+import pytest
+
+import scoring
+from card import CribbageCard, CribbageDeck, CribbageHand
+from scoring import rank_array_index, rank_points, score_hands
+
+
+def check_counts(hands_and_cuts):
+    hand = CribbageHand()
+    num = 0
+    for cards, cut_card in hands_and_cuts:
+        hand.cards = list(cards)
+        expected = hand._count_reference(cut_card)
+        actual = hand.count(cut_card)
+        assert actual == expected, f"{hand.cards} cut {cut_card}"
+        num += 1
+    return num
+
+
+def test_rank_tables_match_rank_points():
+    array = scoring.RANK_ARRAY
+    for ranks, points in scoring.RANK_TABLE.items():
+        expected = rank_points(ranks)
+        assert points == expected, ranks
+        if len(ranks) == 5:
+            assert array[rank_array_index(np.array(ranks))] == expected, ranks
+
+
+def test_rank_array_4_matches_rank_points():
+    array = scoring.RANK_ARRAY_4
+    for ranks in scoring.rank_multisets(4):
+        assert array[rank_array_index(np.array(ranks))] == rank_points(ranks), ranks
+
+
+def test_count_table_sampled():
+    rng = random.Random(0)
+    deck = CribbageCard.all()
+
+    def sample():
+        for _ in range(50000):
+            *cards, cut_card = rng.sample(deck, 5)
+            yield cards, cut_card
+
+    assert check_counts(sample()) == 50000
+
+
+@pytest.mark.slow
+def test_count_table_exhaustive():
+    """
+    Every one of the 12,994,800 hand and cut card combinations, a few minutes
+    """
+    deck = CribbageCard.all()
+    num = check_counts(
+        (cards, cut_card)
+        for cards in combinations(deck, 4)
+        for cut_card in deck
+        if cut_card not in cards
+    )
+    assert num == 12994800
+
+
+def test_score_hands_matches_count():
+    rng = np.random.default_rng(0)
+    num_hands = 20000
+    cards = np.argsort(rng.random((num_hands, 52)), axis=1)[:, :5]
+    is_crib = rng.random(num_hands) < 0.5
+    actual = score_hands(cards, is_crib)
+
+    hand = CribbageHand()
+    for row, crib, points in zip(cards.tolist(), is_crib, actual):
+        *hand.cards, cut_card = [CribbageCard.deserialize(num) for num in row]
+        assert points == hand.count(cut_card, bool(crib)), f"{hand.cards} cut {cut_card}"
+
+
+@pytest.mark.parametrize('num_known', [2, 3, 4])
+@pytest.mark.parametrize('is_crib', [False, True])
+def test_numpy_predict_matches_exact(num_known, is_crib):
+    deck = CribbageDeck()
+    deck.shuffle(random.Random(num_known))
+    hand = CribbageHand(deck.deal(num_known))
+
+    expected = hand.predict(deck.remaining_cards, is_crib=is_crib)
+    actual = hand.predict(deck.remaining_cards, is_crib=is_crib, backend='numpy')
+    assert actual == pytest.approx(expected, abs=1e-9)
+
+
+def test_pegging_points():
+    # Ranks are 0 based: a 5 onto a 10 makes 15, a third 7 is a pair royal
+    assert scoring.pegging_points([9], 10, 4, 0) == 2
+    assert scoring.pegging_points([6, 6], 14, 6, 2) == 6
+    # Runs count in any order, 3 4 then a 2 makes a run of three
+    assert scoring.pegging_points([2, 3], 7, 1, 1) == 3
+    # Exactly 31
+    assert scoring.pegging_points([9, 9, 0], 21, 9, 0) == 2
@@ -0,0 +1,79 @@
+import random
+
+import pytest
+
+from sim import (
+    WINNING_SCORE,
+    ClassifierThrow,
+    MonteCarloPeg,
+    best_throw,
+    greedy_peg,
+    play_games,
+    random_peg,
+    random_throw,
+)
+from tournament import MatchupStats, RunningStat
+
+
+def test_games_are_repeatable():
+    first = list(play_games(20, [random_throw] * 2, [random_peg] * 2, seed=3))
+    second = list(play_games(20, [random_throw] * 2, [random_peg] * 2, seed=3))
+    assert first == second
+
+    for i, result in enumerate(first):
+        assert result.first_dealer == i % 2
+        assert result.scores[result.winner] >= WINNING_SCORE
+        assert result.scores[1 - result.winner] < WINNING_SCORE
+
+
+def test_peg_policies_only_see_what_they_could_know():
+    calls = []
+
+    def checking_peg(pegging_hand, playable, pile, rng, info):
+        assert set(playable) <= set(pegging_hand)
+        assert all(pile.count() + card.value <= pile.PEGGING_LIMIT for card in playable)
+        assert len(info.thrown) == 2
+        assert info.cut_card not in pegging_hand and info.cut_card not in info.thrown
+        assert 0 <= info.num_opponent_cards <= 4
+        calls.append(info)
+        return greedy_peg(pegging_hand, playable, pile, rng, info)
+
+    list(play_games(5, [best_throw, random_throw], [checking_peg, random_peg]))
+    assert calls and all(info.player == 0 for info in calls)
+
+
+def test_classifier_and_monte_carlo_policies():
+    class FirstTwo:
+        def throw(self, is_dealer, serialized_card_array):
+            assert len(serialized_card_array) == 6
+            return [0, 1]
+
+    monte_carlo_peg = MonteCarloPeg(time_budget=0.002, max_samples=20)
+    result, = play_games(1, [ClassifierThrow(FirstTwo()), random_throw],
+                         [monte_carlo_peg, greedy_peg])
+    assert max(result.scores) >= WINNING_SCORE
+
+
+def test_running_stat():
+    rng = random.Random(0)
+    xs = [rng.random() for _ in range(100)]
+    stat = RunningStat()
+    for x in xs:
+        stat.add(x)
+
+    mean = sum(xs) / len(xs)
+    assert stat.mean == pytest.approx(mean)
+    assert stat.variance == pytest.approx(sum((x - mean) ** 2 for x in xs) / (len(xs) - 1))
+    low, high = stat.interval()
+    assert low < mean < high
+
+
+def test_matchup_separates():
+    stats = MatchupStats('a', 'b')
+    assert not stats.separated()
+    for _ in range(50):
+        stats.add(1.0, 10)
+        stats.add(0.5, 0)
+    assert stats.num_games == 200
+    assert stats.separated()
+    assert str(stats).startswith('a vs b: 200 games')
@@ -1,22 +1,69 @@
 import numpy as np
 
 import copy
+import logging
 import os
 import random
 import csv
 import pickle
-from itertools import combinations
 
-from card import CribbageDeck, CribbageHand
-
-# Classifiers
-from sklearn.ensemble import (
-    RandomForestClassifier,
-    AdaBoostClassifier,
+from card import CribbageCard, CribbageDeck
+from discard import DISCARDS, best_discard, discard_value
+from dataset import (
+    DATASET_CSV,
+    DATASET_BIN,
+    DatasetWriter,
+    load_training_data,
+    load_dataset,
+    stream_batches,
+    write_batches,
+    batch_features,
 )
+from discard_table import DiscardTable, DISCARD_TABLE
+from crib_table import CRIB_TABLE, load_crib_table, table_key
+from features import FEATURE_MEMO, THROWN_INDEXES, discard_features, throw_features
+
+logger = logging.getLogger(__name__)
 
 PICKLE_FILE = 'classifier.pickle'
-DATASET_CSV = 'throwing_dataset.csv'
+MODEL_FILE = 'classifier.joblib'
+DISCARD_MODEL_FILE = 'discard_model.joblib'
+
+NUM_RAW_FEATURES = 7  # [is_dealer, *cards], what models from before features.py saw
+
+# Every model artifact loaded by this process, by absolute path
+_MODEL_REGISTRY = {}
+
+
+def load_model(model_file):
+    """
+    Loads a model artifact once per process, every caller after the first
+    shares the same estimators.
+    .joblib artifacts have their arrays memory-mapped, so the pages can be
+    shared between worker processes too.
+    Both formats are pickles underneath, only load artifacts you made yourself
+    """
+    key = os.path.abspath(model_file)
+
+    try:
+        return _MODEL_REGISTRY[key]
+    except KeyError:
+        pass
+
+    logger.info(f"Loading classifiers from {model_file}")
+    if model_file.endswith('.pickle'):
+        with open(model_file, 'rb') as fp:
+            model = pickle.load(fp)
+    else:
+        import joblib  # Comes with sklearn, so only import it when needed
+        model = joblib.load(model_file, mmap_mode='r')
+
+    _MODEL_REGISTRY[key] = model
+    return model
+
+
+def default_model_file():
+    return MODEL_FILE if os.path.exists(MODEL_FILE) else PICKLE_FILE
 
 
 def run_classifier(label, features, classifier, validation_type):
@@ -36,47 +83,36 @@ def run_classifier(label, features, classifier, validation_type):
     return avg, accuracies
 
 
-def gen_dataset(n_iter=5000):
+def gen_dataset(n_iter=5000, dataset_path=DATASET_CSV):
+    """
+    Appends to a CSV dataset, anything else is written fresh in the binary
+    format from dataset.py
+    """
     deck = CribbageDeck()
 
-    fp = open(DATASET_CSV, 'a+')
-    writer = csv.writer(fp)
+    if dataset_path.endswith('.csv'):
+        fp = open(dataset_path, 'a+')
+        writer = csv.writer(fp)
+    else:
+        fp = writer = DatasetWriter(dataset_path)
 
     for is_dealer in [0, 1]:
         for i in range(n_iter):
-            best = None
-            best_score = float("-inf")
-
             deck.shuffle()
             full_hand = deck.deal(6)
 
-            for combo in combinations(full_hand, 4):
-                thrown = full_hand[:]
-                for card in combo:
-                    thrown.remove(card)
-
-                avg_hand = CribbageHand(combo).predict(deck.remaining_cards, quality=0.1)
-                avg_crib = CribbageHand(thrown).predict(deck.remaining_cards, quality=0.1)
-
-                if is_dealer:
-                    hand_score = avg_hand + avg_crib
-                else:
-                    hand_score = avg_hand - avg_crib
-
-                if hand_score > best_score:
-                    best_score = hand_score
-                    best = thrown
+            best = [full_hand[index] for index in best_discard(full_hand, is_dealer)]
 
             data_point = [
-                str(is_dealer),  # Whether you're dealing
-                *[str(card.serialize()) for card in full_hand],  # Cards
-                *[str(full_hand.index(card)) for card in best],  # Best to throw
+                is_dealer,  # Whether you're dealing
+                *[card.serialize() for card in full_hand],  # Cards
+                *[full_hand.index(card) for card in best],  # Best to throw
             ]
 
             writer.writerow(data_point)
 
             if not i % 100:
-                print(f"Trial {i} done")
+                logger.info(f"Trial {i} done")
 
     fp.close()
 
@@ -88,136 +124,325 @@ class RandomThrowingClassifier:
     def throw(self, *args, **kwargs):
         return random.sample(self.card_indexes, 2)
 
+    def throw_batch(self, is_dealer_array, cards_matrix):
+        return np.array([self.throw() for _ in range(len(cards_matrix))])
+
+
+class TableThrowingClassifier:
+    """
+    Looks the best discard up in the table made by discard_table.py
+    """
+    def __init__(self, table_path=DISCARD_TABLE):
+        self.table = DiscardTable(table_path)
+
+    def throw(self, is_dealer, serialized_card_array):
+        assert len(serialized_card_array) == 6
+
+        full_hand = [CribbageCard.deserialize(num) for num in serialized_card_array]
+        return list(self.table.best_discard(full_hand, is_dealer))
+
+    def throw_batch(self, is_dealer_array, cards_matrix):
+        return np.array([
+            self.throw(is_dealer, serialized_card_array)
+            for is_dealer, serialized_card_array in zip(is_dealer_array, cards_matrix)
+        ])
+
 
 class ThrowingClassifier:
     def __init__(self, classifier=None):
-        self.index_classifiers = []
+        self._index_classifiers = []
+        self._model_file = None
 
         if classifier is not None:
             for i in range(6):
-                self.index_classifiers.append(copy.deepcopy(classifier))
-
-    def train(self, csv_path):
-        data = np.loadtxt(csv_path, delimiter=',')
-        features = data[:, :-2]  # Features
-        class_1 = data[:, -1]    # Classification
-        class_2 = data[:, -2]
-
-        classes = [[], [], [], [], [], []]
-        for indexes in zip(class_1, class_2):
-            # The indexes represent the two cards that should be thrown
-            for i in range(6):
-                classes[i].append(int(i in indexes))
+                self._index_classifiers.append(copy.deepcopy(classifier))
+
+    @property
+    def index_classifiers(self):
+        """
+        Models from load() aren't read (and sklearn isn't imported) until
+        they're first used
+        """
+        if self._index_classifiers is None:
+            self._index_classifiers = load_model(self._model_file)
+        return self._index_classifiers
+
+    @index_classifiers.setter
+    def index_classifiers(self, index_classifiers):
+        self._index_classifiers = index_classifiers
+
+    @staticmethod
+    def _features(raw_features, memo=FEATURE_MEMO):
+        """
+        Adds the hand features from features.py onto [is_dealer, *cards]
+        Training passes memo=None, working out a big batch from scratch is
+        cheaper than canonicalizing every hand to look it up
+        """
+        return throw_features(raw_features[:, 0], raw_features[:, 1:], memo)
+
+    def train(self, dataset_path):
+        """
+        Trains on a CSV or binary dataset, see dataset.py
+        """
+        features, thrown = load_training_data(dataset_path)
+        features = self._features(features, memo=None)
+
+        # The indexes represent the two cards that should be thrown
+        classes = [(thrown == i).any(axis=1).astype(np.uint8) for i in range(6)]
 
         for i in range(6):
             self.index_classifiers[i].fit(features, classes[i])
 
+    def train_stream(self, batches):
+        """
+        Trains out-of-core on batches of records, see dataset.stream_batches()
+        and dataset.read_batches(). Only one batch is held at a time, so the
+        index classifiers need partial_fit(), see streaming_classifier()
+        Returns the number of rows trained on
+        """
+        num_rows = 0
+        for batch in batches:
+            features, thrown = batch_features(batch)
+            features = self._features(features, memo=None)
+            for i, clf in enumerate(self.index_classifiers):
+                classes = (thrown == i).any(axis=1).astype(np.uint8)
+                clf.partial_fit(features, classes, classes=[0, 1])
+            num_rows += len(batch)
+        return num_rows
+
     @classmethod
-    def load(cls, pickle_file=PICKLE_FILE):
+    def load(cls, model_file=None):
         obj = cls()
 
-        print(f"Loading classifiers from {pickle_file}")
-        with open(pickle_file, 'rb') as fp:
-            index_classifiers = pickle.load(fp)
+        obj._model_file = model_file or default_model_file()
+        obj._index_classifiers = None
+        return obj
+
+    def dump(self, model_file=MODEL_FILE):
+        if model_file.endswith('.pickle'):
+            with open(model_file, 'wb') as fp:
+                pickle.dump(self.index_classifiers, fp)
+        else:
+            import joblib
+            joblib.dump(self.index_classifiers, model_file)
+
+        _MODEL_REGISTRY.pop(os.path.abspath(model_file), None)
+
+    def throw(self, is_dealer, serialized_card_array):
+        assert len(serialized_card_array) == 6
+
+        indices = self.throw_batch([is_dealer], [serialized_card_array])[0]
+        return [int(index) for index in indices]
+
+    def throw_batch(self, is_dealer_array, cards_matrix):
+        """
+        Picks the cards to throw for N hands at once, with one predict_proba
+        call per index classifier. Returns an N x 2 array of indexes
+        """
+        cards_matrix = np.asarray(cards_matrix)
+        assert cards_matrix.ndim == 2 and cards_matrix.shape[1] == 6
+
+        features = np.column_stack((np.asarray(is_dealer_array, dtype=int), cards_matrix))
+        if getattr(self.index_classifiers[0], 'n_features_in_', None) != NUM_RAW_FEATURES:
+            features = self._features(features)
+
+        # Probability that each card should be kept
+        scores = np.column_stack([
+            clf.predict_proba(features)[:, 0]
+            for clf in self.index_classifiers
+        ])
+
+        return np.argsort(scores, axis=1, kind='stable')[:, :2]
+
+
+class DiscardModel:
+    """
+    One regressor that scores each of the 15 discards from discard_features()
+    and throws the best, instead of a classifier per card.
+    Trained on the value of every discard when the dataset has them, and on
+    1 for the best discard and 0 for the rest when it doesn't
+    """
+    def __init__(self, regressor=None):
+        if regressor is None:
+            from sklearn.ensemble import HistGradientBoostingRegressor
+            regressor = HistGradientBoostingRegressor(max_iter=200)
+        self._regressor = regressor
+        self._model_file = None
+
+    @property
+    def regressor(self):
+        """
+        Models from load() aren't read until they're first used
+        """
+        if self._regressor is None:
+            self._regressor = load_model(self._model_file)
+        return self._regressor
+
+    @staticmethod
+    def _training_data(batch):
+        features = discard_features(batch['is_dealer'], batch['cards'])
+        if 'values' in batch.dtype.names:
+            targets = np.asarray(batch['values'], dtype=np.float32)
+        else:
+            best = [DISCARDS.index(tuple(sorted(thrown))) for thrown in batch['thrown'].tolist()]
+            targets = np.zeros((len(batch), len(DISCARDS)), dtype=np.float32)
+            targets[np.arange(len(batch)), best] = 1
+        return features.reshape(-1, features.shape[-1]), targets.reshape(-1)
+
+    def train(self, dataset_path):
+        """
+        Trains on a whole binary dataset, see dataset.py
+        """
+        self.regressor.fit(*self._training_data(load_dataset(dataset_path)))
+
+    def train_stream(self, batches):
+        """
+        Trains out-of-core, like ThrowingClassifier.train_stream(). Needs a
+        regressor with partial_fit(), like SGDRegressor
+        """
+        num_rows = 0
+        for batch in batches:
+            self.regressor.partial_fit(*self._training_data(batch))
+            num_rows += len(batch)
+        return num_rows
 
-        obj.index_classifiers = index_classifiers
+    @classmethod
+    def load(cls, model_file=DISCARD_MODEL_FILE):
+        obj = cls.__new__(cls)
+        obj._regressor = None
+        obj._model_file = model_file
         return obj
 
-    def dump(self, pickle_file=PICKLE_FILE):
-        with open(pickle_file, 'wb') as fp:
-            pickle.dump(self.index_classifiers, fp)
+    def dump(self, model_file=DISCARD_MODEL_FILE):
+        import joblib
+        joblib.dump(self.regressor, model_file)
+        _MODEL_REGISTRY.pop(os.path.abspath(model_file), None)
 
     def throw(self, is_dealer, serialized_card_array):
         assert len(serialized_card_array) == 6
 
-        features = [int(is_dealer), *serialized_card_array]
-        scores = []
+        indices = self.throw_batch([is_dealer], [serialized_card_array])[0]
+        return [int(index) for index in indices]
+
+    def throw_batch(self, is_dealer_array, cards_matrix):
+        """
+        Scores all 15 discards of N hands with one predict() call. Returns an
+        N x 2 array of indexes
+        """
+        features = discard_features(is_dealer_array, cards_matrix)
 
-        for clf in self.index_classifiers:
-            scores.append(float(clf.predict_proba([features])[0][0]))
+        # Models saved before discard_features() changed would otherwise
+        # fail deep inside predict(), or quietly score the wrong columns
+        num_features = getattr(self.regressor, 'n_features_in_', None)
+        if num_features is not None and num_features != features.shape[-1]:
+            raise ValueError(
+                f"{self._model_file or 'The discard model'} was trained on "
+                f"{num_features} features, discard_features() makes "
+                f"{features.shape[-1]}. Retrain it"
+            )
 
-        best_two = sorted(enumerate(scores), key=lambda t: t[1])[:2]
+        scores = self.regressor.predict(features.reshape(-1, features.shape[-1]))
+        best = scores.reshape(len(features), len(DISCARDS)).argmax(axis=1)
+        return THROWN_INDEXES[best]
 
-        indices = [index for index, _ in best_two]
 
-        assert len(indices) == 2
+def streaming_classifier():
+    """
+    A ThrowingClassifier that can be trained with train_stream()
+    """
+    from sklearn.linear_model import SGDClassifier
 
-        return indices
+    return ThrowingClassifier(SGDClassifier(loss='log_loss'))
 
 
-def test_dataset(num_trials=1000):
+def gen_and_train(num_rows, classifier=None, dataset_path=DATASET_BIN,
+                  batch_rows=4096, seed=0, processes=1):
+    """
+    Deals, evaluates, saves and trains on num_rows hands in one pass, batch
+    by batch, so training starts with the first batch and memory stays flat
+    however many rows there are. Pass dataset_path=None to skip saving
+    """
+    if classifier is None:
+        classifier = streaming_classifier()
+
+    batches = stream_batches(num_rows, batch_rows, seed, processes=processes)
+    if dataset_path is None:
+        classifier.train_stream(batches)
+        return classifier
+
+    with DatasetWriter(dataset_path, with_values=True) as writer:
+        classifier.train_stream(write_batches(batches, writer))
+    return classifier
+
+
+def default_throwing_classifier():
+    """
+    The best classifier there is a saved table or model for
+    """
+    if os.path.exists(DISCARD_TABLE):  # Exact and doesn't need a model
+        return TableThrowingClassifier()
+    if os.path.exists(DISCARD_MODEL_FILE):
+        return DiscardModel.load()
+    return ThrowingClassifier.load()
+
+
+def test_dataset(num_trials=1000, backend=None, crib_table=None, actual_clf=None):
     """
     Most recent results:
         ACTUAL 11.002982246376813
         RANDOM 9.354994685990336
+    backend='numpy' scores the throws with scoring.score_hands(), and a table
+    from crib_table.py looks the cribs up instead of working them out.
+    actual_clf is anything with throw_batch(), by default the saved
+    ThrowingClassifier, trained first if there isn't one
     """
-    clf = AdaBoostClassifier(
-        base_estimator=RandomForestClassifier(n_estimators=20),
-        n_estimators=20,
-        learning_rate=1,
-    )
+    if actual_clf is None and os.path.exists(default_model_file()):
+        actual_clf = ThrowingClassifier.load()
+    elif actual_clf is None:
+        from sklearn.ensemble import (
+            RandomForestClassifier,
+            AdaBoostClassifier,
+        )
+
+        clf = AdaBoostClassifier(
+            base_estimator=RandomForestClassifier(n_estimators=20),
+            n_estimators=20,
+            learning_rate=1,
+        )
 
-    if os.path.exists(PICKLE_FILE):
-        actual_clf = ThrowingClassifier.load(PICKLE_FILE)
-    else:
         actual_clf = ThrowingClassifier(clf)
         actual_clf.train(DATASET_CSV)
-        actual_clf.dump(PICKLE_FILE)
+        actual_clf.dump(MODEL_FILE)
 
     random_clf = RandomThrowingClassifier()
 
     actual_total = 0.0
     random_total = 0.0
 
+    crib_key = table_key(crib_table) if crib_table is not None else None
+
     deck = CribbageDeck()
 
     for is_dealer in [0, 1]:
+        hands = []
         for i in range(num_trials):
             deck.shuffle()
-            full_hand = deck.deal(6)
-            cards_serialized = [card.serialize() for card in full_hand]
-
-            assert len(cards_serialized) == 6
+            hands.append(deck.deal(6))
 
-            actual_indices_to_throw = actual_clf.throw(is_dealer, cards_serialized)
+        cards_matrix = [[card.serialize() for card in full_hand] for full_hand in hands]
+        is_dealer_array = [is_dealer] * num_trials
 
-            actual_hand = CribbageHand([
-                card for i, card in enumerate(full_hand)
-                if i not in actual_indices_to_throw
-            ])
+        actual_throws = actual_clf.throw_batch(is_dealer_array, cards_matrix)
+        random_throws = random_clf.throw_batch(is_dealer_array, cards_matrix)
 
-            actual_crib = CribbageHand([
-                card for i, card in enumerate(full_hand)
-                if i in actual_indices_to_throw
-            ])
-
-            random_indices_to_throw = random_clf.throw()
-
-            random_hand = CribbageHand([
-                card for i, card in enumerate(full_hand)
-                if i not in random_indices_to_throw
-            ])
-
-            random_crib = CribbageHand([
-                card for i, card in enumerate(full_hand)
-                if i in random_indices_to_throw
-            ])
-
-            if is_dealer:
-                actual_score = actual_hand.predict(deck.remaining_cards, quality=0.5) + \
-                               actual_crib.predict(deck.remaining_cards, quality=0.2)
-
-                random_score = random_hand.predict(deck.remaining_cards, quality=0.5) + \
-                               random_crib.predict(deck.remaining_cards, quality=0.2)
-            else:
-                actual_score = actual_hand.predict(deck.remaining_cards, quality=0.5) - \
-                               actual_crib.predict(deck.remaining_cards, quality=0.2)
-
-                random_score = random_hand.predict(deck.remaining_cards, quality=0.5) - \
-                               random_crib.predict(deck.remaining_cards, quality=0.2)
-
-            actual_total += actual_score
-            random_total += random_score
+        for full_hand, actual_indices_to_throw, random_indices_to_throw in \
+                zip(hands, actual_throws, random_throws):
+            actual_total += discard_value(
+                full_hand, actual_indices_to_throw, is_dealer, backend, crib_table, crib_key,
+            )
+            random_total += discard_value(
+                full_hand, random_indices_to_throw, is_dealer, backend, crib_table, crib_key,
+            )
 
     actual_score = actual_total / num_trials
     random_score = random_total / num_trials
@@ -226,9 +451,16 @@ def test_dataset(num_trials=1000):
 
 
 def main():
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
     # gen_dataset(10000)
 
-    actual_score, random_score = test_dataset(2000)
+    # The crib table is much faster, but only approximates the cribs
+    crib_table = load_crib_table() if os.path.exists(CRIB_TABLE) else None
+    actual_clf = DiscardModel.load() if os.path.exists(DISCARD_MODEL_FILE) else None
+    actual_score, random_score = test_dataset(
+        2000, crib_table=crib_table, actual_clf=actual_clf,
+    )
 
     print(f"ACTUAL {actual_score}")
     print(f"RANDOM {random_score}")
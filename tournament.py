@@ -0,0 +1,179 @@
+"""
+Plays policies against each other over as many games as it takes to tell them
+apart. Games are played in pairs on the same deals with the seats swapped, so
+luck of the deal mostly cancels out, and each matchup stops as soon as the
+confidence interval on the win rate no longer contains 50%
+"""
+import math
+import multiprocessing
+import os
+import random
+from collections import namedtuple
+from itertools import combinations
+
+from sim import (
+    HeadlessGame,
+    ClassifierThrow,
+    MonteCarloPeg,
+    random_throw,
+    best_throw,
+    random_peg,
+    greedy_peg,
+)
+
+Policy = namedtuple('Policy', ['name', 'throw', 'peg'])
+
+Z_99 = 2.576  # Two sided 99% normal quantile
+
+
+def _play_pairs(args):
+    """
+    Plays a game and its seat-swapped twin for each seed
+    Returns a list of (win share, point spread) for policy a, one per pair
+    """
+    policy_a, policy_b, seeds = args
+
+    results = []
+    for seed in seeds:
+        win_share = 0.0
+        spread = 0
+        for a_seat in (0, 1):
+            policies = (policy_a, policy_b) if a_seat == 0 else (policy_b, policy_a)
+            game = HeadlessGame(
+                [policy.throw for policy in policies],
+                [policy.peg for policy in policies],
+                rng=random.Random(f"policies-{seed}"),
+                deal_rng=random.Random(seed),
+            )
+            result = game.play(first_dealer=seed % 2)
+
+            win_share += (result.winner == a_seat) / 2
+            spread += result.scores[a_seat] - result.scores[1 - a_seat]
+        results.append((win_share, spread / 2))
+
+    return results
+
+
+class RunningStat:
+    """
+    Welford's running mean and variance
+    """
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, x):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self._m2 += delta * (x - self.mean)
+
+    @property
+    def variance(self):
+        return self._m2 / (self.n - 1) if self.n > 1 else float('inf')
+
+    def interval(self, z=Z_99):
+        half_width = z * math.sqrt(self.variance / self.n) if self.n else float('inf')
+        return self.mean - half_width, self.mean + half_width
+
+
+class MatchupStats:
+    def __init__(self, name_a, name_b):
+        self.name_a = name_a
+        self.name_b = name_b
+        self.win_rate = RunningStat()  # Per pair of games, for a
+        self.spread = RunningStat()
+
+    def add(self, win_share, spread):
+        self.win_rate.add(win_share)
+        self.spread.add(spread)
+
+    @property
+    def num_games(self):
+        return self.win_rate.n * 2
+
+    def separated(self, z=Z_99):
+        low, high = self.win_rate.interval(z)
+        return high < 0.5 or low > 0.5
+
+    def __str__(self):
+        low, high = self.win_rate.interval()
+        return (
+            f"{self.name_a} vs {self.name_b}: {self.num_games} games, "
+            f"win rate {self.win_rate.mean:.3f} [{low:.3f}, {high:.3f}], "
+            f"spread {self.spread.mean:+.2f}"
+        )
+
+
+def run_matchup(policy_a, policy_b, max_games=100000, min_games=1000,
+                batch_pairs=100, z=Z_99, seed=0, processes=None, report=print):
+    """
+    Plays policy_a against policy_b on a process pool, reporting the stats
+    after every batch, until the confidence interval on the win rate
+    separates from 50% or max_games have been played
+    """
+    stats = MatchupStats(policy_a.name, policy_b.name)
+
+    # Each seed gets its own block of deals
+    num_pairs = max_games // 2
+    first, last = seed * num_pairs, (seed + 1) * num_pairs
+    batches = [
+        (policy_a, policy_b, range(start, min(start + batch_pairs, last)))
+        for start in range(first, last, batch_pairs)
+    ]
+
+    with multiprocessing.Pool(processes) as pool:
+        for results in pool.imap_unordered(_play_pairs, batches):
+            for win_share, spread in results:
+                stats.add(win_share, spread)
+            if report is not None:
+                report(stats)
+            if stats.num_games >= min_games and stats.separated(z):
+                pool.terminate()  # Drop the batches still queued up
+                break
+
+    return stats
+
+
+def run_tournament(policies, **kwargs):
+    """
+    Runs every policy against every other one, see run_matchup
+    """
+    return [
+        run_matchup(policy_a, policy_b, **kwargs)
+        for policy_a, policy_b in combinations(policies, 2)
+    ]
+
+
+def main():
+    from throwing_ai import (
+        ThrowingClassifier,
+        RandomThrowingClassifier,
+        default_model_file,
+        default_throwing_classifier,
+    )
+
+    # A few milliseconds a move makes these games about ten times slower
+    monte_carlo_peg = MonteCarloPeg(time_budget=0.005, max_samples=100)
+
+    policies = [
+        Policy('random', random_throw, random_peg),
+        Policy('greedy pegging', random_throw, greedy_peg),
+        Policy('best throw', best_throw, greedy_peg),
+        Policy('random classifier', ClassifierThrow(RandomThrowingClassifier()), greedy_peg),
+        Policy('monte carlo pegging', best_throw, monte_carlo_peg),
+    ]
+    if os.path.exists(default_model_file()):
+        policies += [
+            Policy('classifier', ClassifierThrow(ThrowingClassifier.load()), greedy_peg),
+            # Throws and pegs like RoboCribbagePeggerPlayer
+            Policy('robo pegger', ClassifierThrow(default_throwing_classifier()), monte_carlo_peg),
+        ]
+
+    for stats in run_tournament(policies, max_games=20000, report=None):
+        print(stats)
+
+
+if __name__ == '__main__':
+    main()
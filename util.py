@@ -1,5 +1,8 @@
+import os
 from itertools import combinations, chain
 
+import numpy as np
+
 
 def powerset_min_len(iterable, min_len=2):
     """
@@ -8,3 +11,12 @@ def powerset_min_len(iterable, min_len=2):
     """
     s = list(iterable)
     return chain.from_iterable(combinations(s, r) for r in range(min_len, len(s)+1))
+
+
+def save_npy_atomic(path, array):
+    """
+    np.save() that never leaves a half written file at path
+    """
+    tmp_path = f"{path}.tmp.npy"  # np.save would tack .npy on otherwise
+    np.save(tmp_path, array)
+    os.replace(tmp_path, path)